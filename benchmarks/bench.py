@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+#benchmarks for the SMBX Image Tool. it generates a synthetic sprite pack (like the ones SMBX uses: pngs, gifs with masks and copies of the same sprite under other names), then times every step of the tool on it.
+#to save a baseline:      python benchmarks/bench.py --frames 2000 --output baseline.json
+#to compare with it:      python benchmarks/bench.py --frames 2000 --compare baseline.json
+import os
+import sys
+import io
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import helperdefs
+import imagetool
+import imagejoin
+import palette
+import packer
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmarks the SMBX Image Tool on a synthetic sprite pack.')
+    parser.add_argument('--frames', default=500, type=int, help='The number of images in the pack. The default is 500.')
+    parser.add_argument('--sizes', default='32x32,32x64,64x64,16x16,96x32', help='The sizes of the images, chosen at random. The default is 32x32,32x64,64x64,16x16,96x32.')
+    parser.add_argument('--colors', default=16, type=int, help='The number of colors used in the whole pack. The default is 16.')
+    parser.add_argument('--colors-per-frame', default=6, type=int, help='The number of colors used by each image. The default is 6.')
+    parser.add_argument('--gif-ratio', default=0.2, type=float, help='The fraction of images saved as gif with a mask. The default is 0.2.')
+    parser.add_argument('--dup-ratio', default=0.1, type=float, help='The fraction of images that are copies of another image. The default is 0.1.')
+    parser.add_argument('--seed', default=1, type=int, help='The seed used to generate the pack, so runs can be compared.')
+    parser.add_argument('--repeat', default=1, type=int, help='Runs every step this many times and keeps the fastest run.')
+    parser.add_argument('--jobs', default=1, type=int, help='Passed to the tool as --jobs.')
+    parser.add_argument('--keep', metavar='DIR', help='Generate the pack and the outputs in this directory and keep them, instead of using a temporary one.')
+    parser.add_argument('--output', metavar='FILE', help='Saves the results as json in this file.')
+    parser.add_argument('--compare', metavar='FILE', help='Compares the results with a baseline saved with --output, and exits with 1 if a step is slower.')
+    parser.add_argument('--threshold', default=0.1, type=float, help='How much slower (as a fraction) a step can be before it counts as a regression. The default is 0.1.')
+    return parser.parse_args()
+
+#generates the sprite pack in d. returns the number of files written (gif masks included).
+def generate_pack(d, args):
+    rng = random.Random(args.seed)
+    sizes = [tuple(int(n) for n in s.split('x')) for s in args.sizes.split(',')]
+    #black and white are kept for the gif key and mask
+    colors = [(rng.randint(1, 254), rng.randint(1, 254), rng.randint(1, 254), 255) for c in range(args.colors)]
+    written = []
+    files = 0
+    for n in range(args.frames):
+        if len(written) > 0 and rng.random() < args.dup_ratio:
+            src = rng.choice(written)
+            ext = os.path.splitext(src)[1]
+            shutil.copyfile(d + '/' + src, d + '/sprite-' + str(n) + ext)
+            if ext == '.gif':
+                shutil.copyfile(d + '/' + os.path.splitext(src)[0] + 'm.gif', d + '/sprite-' + str(n) + 'm.gif')
+                files += 1
+            files += 1
+            continue
+        w, h = rng.choice(sizes)
+        frame_colors = rng.sample(colors, min(args.colors_per_frame, len(colors)))
+        #a sprite is a solid blob of colors in a transparent frame
+        data = []
+        for y in range(h):
+            for x in range(w):
+                inside = abs(x - w / 2) < w / 2 - 1 and abs(y - h / 2) < h / 2 - 1
+                data.append(rng.choice(frame_colors) if inside else (0, 0, 0, 0))
+        img = Image.new('RGBA', (w, h))
+        img.putdata(data)
+        if rng.random() < args.gif_ratio:
+            fn = 'sprite-' + str(n) + '.gif'
+            #gifs use black as the transparent color, and their mask is white where the sprite is transparent
+            rgb = Image.new('RGB', (w, h), (0, 0, 0))
+            rgb.paste(img, (0, 0), img)
+            mask = Image.new('RGB', (w, h), (255, 255, 255))
+            mask.paste((0, 0, 0), (0, 0, w, h), img)
+            rgb.convert('P').save(d + '/' + fn)
+            mask.convert('P').save(d + '/sprite-' + str(n) + 'm.gif')
+            files += 2
+        else:
+            fn = 'sprite-' + str(n) + '.png'
+            img.save(d + '/' + fn)
+            files += 1
+        written.append(fn)
+    return files
+
+#resets the peak memory of the process, when the system allows it (only on linux).
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+#returns the peak memory of the process in MB, or None if it can't be read.
+def get_peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    #ru_maxrss is in KB on linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+#runs a step repeat times (calling setup before every run, untimed) and returns the time of the fastest run, the peak memory and the files handled per second. the output of the tool is hidden.
+def time_step(step, files, repeat, setup=None):
+    best = None
+    peak = None
+    for r in range(repeat):
+        if setup != None:
+            setup()
+        reset_peak_rss()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = step()
+            seconds = time.perf_counter() - start
+        if best == None or seconds < best:
+            best = seconds
+        rss = get_peak_rss()
+        if rss != None:
+            peak = rss if peak == None else max(peak, rss)
+    return result, {'seconds': round(best, 4), 'peak_rss_mb': round(peak, 1) if peak != None else None, 'files_per_second': round(files / best, 1) if best > 0 else None}
+
+def clear_dir(d):
+    shutil.rmtree(d, ignore_errors=True)
+    os.makedirs(d)
+
+def run_benchmarks(root, args):
+    pack = root + '/pack'
+    out = root + '/out'
+    clear_dir(pack)
+    files = generate_pack(pack, args)
+    print('Generated ' + str(files) + ' files in ' + pack)
+    stages = {}
+
+    def get_images():
+        images = helperdefs.get_images(pack, True, False)
+        for img in images:
+            img.close()
+        return len(images)
+    n, stages['get_images'] = time_step(get_images, files, args.repeat)
+
+    tool_args = helperdefs.get_args(['--join', 'images', '--convert-gifs', '-idir', pack, '-odir', out, '--jobs', str(args.jobs)])
+    def process():
+        frames = []
+        palettes = palette.PaletteRegistry()
+        filenames = list(helperdefs.scan_images(pack, True, False))
+        for src, (fn, size, pal, key, img) in imagetool.process_images(helperdefs.filter_images(filenames, tool_args), tool_args, 1.0):
+            frames.append(img)
+            palettes.add(pal)
+        return (frames, palettes)
+    (frames, palettes), stages['process_images'] = time_step(process, args.frames, args.repeat)
+
+    maxw = sum(img.size[0] for img in frames)
+    maxh = max(img.size[1] for img in frames)
+    joined, stages['join_images'] = time_step(lambda: imagejoin.join_images(frames, 0, maxw, maxh), len(frames), args.repeat)
+
+    side = int(math.ceil(math.sqrt(len(frames))))
+    imw, imh = max(img.size[0] for img in frames), max(img.size[1] for img in frames)
+    sheet, stages['join_spritesheet'] = time_step(lambda: imagejoin.join_spritesheet(frames, 0, side * imw, side * imh), len(frames), args.repeat)
+
+    def join_packed():
+        positions, w, h = packer.pack_rects([img.size for img in frames], 0)
+        return imagejoin.join_packed(frames, positions, w, h)
+    packed, stages['join_packed'] = time_step(join_packed, len(frames), args.repeat)
+
+    pal_image = palette.get_pal_image(palettes.get_palettes())
+    joined_pal, stages['paste_palette'] = time_step(lambda: palette.paste_palette(joined, pal_image), len(frames), args.repeat)
+
+    #the joined image and its cfg file are saved so they can be separed
+    clear_dir(out)
+    cfg_lines = [os.path.basename(img.filename) + '|' + str(img.size[0]) + '|' + str(img.size[1]) for img in frames]
+    cfg_lines.append('0|' + str(maxw) + '|' + str(maxh) + '|0')
+    with open(out + '/joined.cfg', 'w') as cfg:
+        cfg.write('\n'.join(cfg_lines))
+    joined_pal.save(out + '/joined.png')
+    sheet.save(out + '/sheet.png')
+    joined_img = Image.open(out + '/joined.png')
+    joined_img.load()
+    sheet_img = Image.open(out + '/sheet.png')
+    sheet_img.load()
+
+    jobs = helperdefs.get_jobs(args.jobs)
+    r, stages['separe_withcfg'] = time_step(lambda: imagejoin.separe_withcfg(joined_img, out + '/separed', 1.0, jobs), len(frames), args.repeat, lambda: clear_dir(out + '/separed'))
+    r, stages['separe_spritesheet'] = time_step(lambda: imagejoin.separe_spritesheet(sheet_img, out + '/cells', 1.0, 'cell', imw, imh, 0, jobs), side * side, args.repeat, lambda: clear_dir(out + '/cells'))
+    r, stages['convert_gifs'] = time_step(lambda: helperdefs.convert_gifs(pack, out + '/gifs'), files, args.repeat, lambda: clear_dir(out + '/gifs'))
+
+    config = {key: value for key, value in vars(args).items() if key not in ('keep', 'output', 'compare', 'threshold')}
+    return {'config': config, 'files': files, 'stages': stages}
+
+#compares the results with the baseline. returns the list of steps that got slower than the threshold.
+def compare(results, baseline, threshold):
+    if baseline['config'] != results['config']:
+        print('WARNING: The baseline was made with different settings: ' + json.dumps(baseline['config']))
+    regressions = []
+    print('{:<20}{:>12}{:>12}{:>10}'.format('step', 'baseline', 'now', 'change'))
+    for name, stage in results['stages'].items():
+        old = baseline['stages'].get(name)
+        if old == None:
+            print('{:<20}{:>12}{:>12.4f}'.format(name, '-', stage['seconds']))
+            continue
+        change = (stage['seconds'] - old['seconds']) / old['seconds'] if old['seconds'] > 0 else 0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('{:<20}{:>12.4f}{:>12.4f}{:>+9.1f}%{}'.format(name, old['seconds'], stage['seconds'], change * 100, flag))
+    return regressions
+
+def main():
+    args = get_args()
+    if args.keep != None:
+        os.makedirs(args.keep, exist_ok=True)
+        results = run_benchmarks(os.path.abspath(args.keep), args)
+    else:
+        with tempfile.TemporaryDirectory() as root:
+            results = run_benchmarks(root, args)
+
+    for name, stage in results['stages'].items():
+        print('{:<20}{:>10.4f} s{:>10} MB{:>12} files/s'.format(name, stage['seconds'], str(stage['peak_rss_mb']), str(stage['files_per_second'])))
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print('Results saved to ' + args.output)
+    if args.compare != None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if len(compare(results, baseline, args.threshold)) > 0:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
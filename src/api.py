@@ -0,0 +1,131 @@
+from PIL import Image
+import io
+import helperdefs
+import palette
+import imagejoin
+import gridscan
+import log
+
+#this module lets other python programs use the tool without the command line: the same joining, separing, palette and gif work, on images in memory instead of directories. images can be given as PIL images, bytes of image files or file objects. nothing is printed, and no file is read or written.
+#    import api
+#    image, index = api.join({'block-1.png': img1, 'block-2.png': png_bytes}, layout='packed')
+#    cfg_text = api.format_index(index)
+#    frames = api.separe(image, index)
+LAYOUTS = helperdefs.LAYOUTS
+
+#joins the frames into a single image, like --join. frames is a dict of names and images, or a list of (name, image) pairs. layout is 'images', 'spritesheet' or 'packed'; spritesheets also need sheet_size (the number of columns and rows) and cell_size (the width and height of every cell). with dedupe, frames with the same pixels are pasted once. with with_palette, the palette of the frames is pasted under the joined image like the command line does. returns the joined image and its index (what's written in the cfg file, see format_index).
+def join(frames, layout='images', space=0, sheet_size=None, cell_size=None, dedupe=False, with_palette=True):
+    sheet = None
+    if layout == 'spritesheet':
+        if sheet_size == None or cell_size == None:
+            raise ValueError('ERROR: Can\'t join into a spritesheet without sheet_size and cell_size.')
+        sheet = tuple(sheet_size) + tuple(cell_size)
+    index_frames = []
+    pasted_frames = []
+    images = []
+    hashes = {}
+    aliases = []
+    palettes = palette.PaletteRegistry()
+    with log.silenced():
+        for name, img in get_frames(frames):
+            frame = {'name': name, 'w': img.size[0], 'h': img.size[1]}
+            index_frames.append(frame)
+            palettes.add(palette.get_packed_palette(img))
+            key = helperdefs.get_image_hash(img) if dedupe else None
+            if dedupe and key in hashes:
+                aliases.append((frame, hashes[key]))
+                continue
+            hashes[key] = len(images)
+            pasted_frames.append(frame)
+            images.append(img)
+        positions, w, h = imagejoin.get_layout([(frame['w'], frame['h']) for frame in pasted_frames], layout, space, sheet)
+        imagejoin.set_positions(pasted_frames, aliases, positions)
+        image = imagejoin.join_packed(images, positions, w, h)
+        if with_palette:
+            image = palette.paste_palette(image, palette.get_pal_image(palettes.get_palettes()))
+    return (image, helperdefs.get_index(layout, w, h, space, [frame for frame in index_frames if 'x' in frame]))
+
+#crops every frame of a joined image out of it, like --separe. index is the one returned by join, or the text of a cfg file (the old ones too). with resize (in %), the frames are resized once they're cropped. returns a dict of names and images.
+def separe(image, index, resize=100):
+    if isinstance(index, bytes):
+        index = index.decode('utf-8')
+    if isinstance(index, str):
+        index = helperdefs.parse_cfg_text(index)
+    img = open_image(image)
+    with log.silenced():
+        return {name: img.crop(box) if r == None else helperdefs.scale_image(img.crop(box), r) for box, r, name in imagejoin.get_index_crops(index['frames'], resize / 100)}
+
+#cuts a spritesheet without an index into cells, like --separe without a cfg file. cell_size is the width and height of the cells; when it's None the cells (and the space between them) are found by looking at the image, which needs numpy, and the palette under a joined spritesheet is left out. empty cells are left out unless keep_empty is true. returns a dict of names (name followed by the number of the cell) and images.
+def separe_grid(image, cell_size=None, space=0, name='', keep_empty=False):
+    img = open_image(image)
+    if cell_size != None:
+        origin, (w, h), size = (0, 0), cell_size, img.size
+    else:
+        grid = gridscan.detect_grid(img)
+        if grid == None:
+            raise ValueError('ERROR: No grid was found in the image.')
+        origin, w, h, space, size = grid
+    occupied = None if keep_empty else gridscan.get_occupied_cells(img, w, h, space, origin, size)
+    return {fn: img.crop(box) for box, r, fn in imagejoin.get_grid_crops(size, name, w, h, space, origin, occupied)}
+
+#returns the colors used by an image, as a sorted list of RGBA tuples. transparent colors are left out.
+def get_palette(image):
+    return palette.get_palette(open_image(image))
+
+#returns the palette image of some images, like the one pasted under joined images: one row for every palette that isn't part of another one.
+def get_palette_image(images):
+    palettes = palette.PaletteRegistry()
+    for image in images:
+        palettes.add(palette.get_packed_palette(open_image(image)))
+    return palette.get_pal_image(palettes.get_palettes())
+
+#recolours an image like --apply-palette: every color of the original palette image becomes the color at the same place in the edited one.
+def apply_palette(image, original, edited):
+    return palette.apply_palette_lut(open_image(image), palette.get_palette_lut(open_image(original), open_image(edited)))
+
+#converts an SMBX gif to an RGBA image, using its mask if given (like --convert-gifs).
+def convert_gif(gif, mask=None):
+    if mask == None:
+        return helperdefs.gif_to_png(open_image(gif))
+    return helperdefs.gif_to_png_mask(open_image(gif), open_image(mask))
+
+#returns the text of the cfg file for an index, as json or in the old format.
+def format_index(index, legacy=False):
+    return helperdefs.format_cfg(index, legacy)
+
+#returns the index written in the text of a cfg file (json or old format).
+def parse_index(text):
+    return helperdefs.parse_cfg_text(text)
+
+#returns the bytes of an image saved as png. with indexed, it's saved in palette mode when it has 256 colors or less (like --indexed).
+def encode(image, indexed=False, compress_level=6, optimize=False):
+    indexed_image = palette.get_indexed_image(image) if indexed else None
+    if indexed_image != None:
+        image = indexed_image
+    data = io.BytesIO()
+    image.save(data, 'PNG', compress_level=compress_level, optimize=optimize)
+    return data.getvalue()
+
+#opens an image given as a PIL image, bytes or a file object. returns a new, already loaded image (PIL images are copied, so they aren't changed).
+def open_image(data):
+    if isinstance(data, Image.Image):
+        img = data.copy()
+    else:
+        if isinstance(data, (bytes, bytearray)):
+            data = io.BytesIO(data)
+        with Image.open(data) as im:
+            im.load()
+            img = im.copy()
+    img.filename = ''
+    return img
+
+#returns the frames given to join as a list of (name, image).
+def get_frames(frames):
+    if isinstance(frames, dict):
+        frames = frames.items()
+    result = []
+    for name, data in frames:
+        img = open_image(data)
+        img.filename = name
+        result.append((name, img))
+    return result
@@ -0,0 +1,245 @@
+import os
+import io
+import time
+import threading
+
+#this module lets the tool use zip and tar archives like directories, for --input-dir and --output-dir. a file in an archive is named by the path of the archive followed by its name inside it, like pack.zip/npc/npc-1.png. every other path is just passed to the os.
+#zipfile and tarfile are only imported once an archive is used.
+#archives are read straight from memory, with an index of their files made once. files saved into an archive are kept in memory and written all at once by flush(). when a name is already in the archive the whole archive is written again, otherwise the new files are appended.
+EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+#how many bytes of the files of a compressed tar are kept in memory by each archive (see Reader)
+TAR_MEMORY = 256 * 1024 * 1024
+
+#the archives opened by this process, by path
+readers = {}
+#the files waiting to be written, as {archive: {name: data}}
+pending = {}
+lock = threading.Lock()
+
+def is_archive(path): return path.lower().endswith(EXTENSIONS) and not os.path.isdir(path)
+
+#splits a path into the archive and the name inside it ('' for the archive itself). returns None if the path is not in an archive.
+def split(path):
+    path = path.replace(os.sep, '/')
+    if is_archive(path):
+        return (path, '')
+    i = path.find('/', 1)
+    while i != -1:
+        if is_archive(path[:i]):
+            return (path[:i], path[i + 1:].strip('/'))
+        i = path.find('/', i + 1)
+    return None
+
+#this class keeps an archive open, with the size and modification time of every file in it and the directories they're in.
+class Reader:
+    def __init__(self, path):
+        self.path = path
+        self.key = get_os_key(path)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.is_zip = path.lower().endswith('.zip')
+        if self.is_zip:
+            import zipfile
+            self.archive = zipfile.ZipFile(path)
+            for info in self.archive.infolist():
+                if not info.is_dir():
+                    self.files[info.filename.strip('/')] = (info, info.file_size, list(info.date_time))
+        else:
+            import tarfile
+            #a file in a compressed tar can only be found by decompressing the archive from the start, so the files are read in a single pass and kept, up to TAR_MEMORY bytes. the files after that are read from the archive one at a time, the slow way.
+            self.data = {} if get_tar_compression(path) != '' else None
+            self.archive = tarfile.open(path, 'r|*' if self.data != None else 'r')
+            kept = 0
+            for info in self.archive:
+                if info.isfile():
+                    name = os.path.normpath(info.name).replace(os.sep, '/')
+                    self.files[name] = (info, info.size, info.mtime)
+                    if self.data != None and kept + info.size <= TAR_MEMORY:
+                        self.data[name] = self.archive.extractfile(info).read()
+                        kept += info.size
+            if self.data != None and len(self.data) < len(self.files):
+                self.archive.close()
+                self.archive = tarfile.open(path)
+        self.dirs = {''}
+        for name in self.files:
+            while '/' in name:
+                name = name.rsplit('/', 1)[0]
+                self.dirs.add(name)
+
+    def read(self, name):
+        if name not in self.files:
+            raise FileNotFoundError('ERROR: ' + self.path + '/' + name + ' was not found.')
+        info = self.files[name][0]
+        with self.lock:
+            if self.is_zip:
+                return self.archive.read(info)
+            if self.data != None and name in self.data:
+                return self.data[name]
+            return self.archive.extractfile(info).read()
+
+    #returns the names of the files and directories in a directory of the archive.
+    def listdir(self, d):
+        prefix = d + '/' if d != '' else ''
+        names = set()
+        for name in list(self.files) + list(self.dirs):
+            if name.startswith(prefix) and name != d:
+                names.add(name[len(prefix):].split('/', 1)[0])
+        return sorted(names)
+
+    def close(self): self.archive.close()
+
+#returns the reader of an archive, opening it again if the archive changed. readers aren't shared with the worker processes, which open their own.
+def get_reader(path):
+    key = (os.getpid(), path)
+    with lock:
+        reader = readers.get(key)
+        if reader == None or reader.key != get_os_key(path):
+            if reader != None:
+                reader.close()
+            reader = Reader(path)
+            readers[key] = reader
+    return reader
+
+def get_os_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+#returns something Image.open can open: the path itself, or the file read from its archive.
+def get_source(path):
+    parts = split(path)
+    if parts == None:
+        return path
+    return io.BytesIO(get_reader(parts[0]).read(parts[1]))
+
+#opens a file to read or write it, like open. files in archives are read from memory, and written when flush() is called.
+def open_file(path, mode='r'):
+    parts = split(path)
+    if parts == None:
+        return open(path, mode)
+    if 'w' in mode:
+        f = ArchiveFile(path)
+        return f if 'b' in mode else io.TextIOWrapper(f, encoding='utf-8')
+    data = get_reader(parts[0]).read(parts[1])
+    return io.BytesIO(data) if 'b' in mode else io.StringIO(data.decode('utf-8'))
+
+#a file being written into an archive. its content is added to the pending files when it's closed.
+class ArchiveFile(io.BytesIO):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def close(self):
+        if not self.closed:
+            write(self.path, self.getvalue())
+        super().close()
+
+def write(path, data):
+    archive, name = split(path)
+    with lock:
+        pending.setdefault(archive, {})[name] = data
+
+def isfile(path):
+    parts = split(path)
+    if parts == None:
+        return os.path.isfile(path)
+    archive, name = parts
+    if name in pending.get(archive, {}):
+        return True
+    return os.path.isfile(archive) and name in get_reader(archive).files
+
+def isdir(path):
+    parts = split(path)
+    if parts == None:
+        return os.path.isdir(path)
+    archive, name = parts
+    return os.path.isfile(archive) and name in get_reader(archive).dirs
+
+def listdir(path):
+    parts = split(path)
+    if parts == None:
+        return os.listdir(path)
+    return get_reader(parts[0]).listdir(parts[1])
+
+def getsize(path):
+    parts = split(path)
+    if parts == None:
+        return os.path.getsize(path)
+    archive, name = parts
+    if name in pending.get(archive, {}):
+        return len(pending[archive][name])
+    return get_reader(archive).files[name][1]
+
+#returns the size and modification time of a file, to know if it changed.
+def get_key(path):
+    parts = split(path)
+    if parts == None:
+        return get_os_key(path)
+    info, size, mtime = get_reader(parts[0]).files[parts[1]]
+    return [size, mtime]
+
+#returns the pending files and forgets them, so a worker process can send them back to the main one.
+def take_writes():
+    with lock:
+        writes = dict(pending)
+        pending.clear()
+    return writes
+
+def add_writes(writes):
+    with lock:
+        for archive, files in writes.items():
+            pending.setdefault(archive, {}).update(files)
+
+#writes every pending file into its archive.
+def flush():
+    for archive, files in take_writes().items():
+        save_archive(archive, files)
+
+def save_archive(path, files):
+    import zipfile
+    import tarfile
+    old = get_reader(path).files if os.path.isfile(path) else {}
+    replaced = any(name in old for name in files)
+    if path.lower().endswith('.zip') and not replaced:
+        with zipfile.ZipFile(path, 'a') as z:
+            for name, data in files.items():
+                z.writestr(name, data)
+        return
+    if path.lower().endswith('.tar') and not replaced:
+        with tarfile.open(path, 'a') as t:
+            add_tar_files(t, files)
+        return
+    #compressed tars can't be appended to, and names already in the archive must be replaced, so the whole archive is written again
+    reader = get_reader(path) if len(old) > 0 else None
+    kept = {name: reader.read(name) for name in old if name not in files}
+    kept.update(files)
+    tmp = path + '.tmp'
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(tmp, 'w') as z:
+            for name, data in kept.items():
+                z.writestr(name, data)
+    else:
+        with tarfile.open(tmp, 'w:' + get_tar_compression(path)) as t:
+            add_tar_files(t, kept)
+    if reader != None:
+        reader.close()
+    os.replace(tmp, path)
+
+def add_tar_files(t, files):
+    import tarfile
+    now = time.time()
+    for name, data in files.items():
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = now
+        t.addfile(info, io.BytesIO(data))
+
+def get_tar_compression(path):
+    path = path.lower()
+    if path.endswith(('.tar.gz', '.tgz')):
+        return 'gz'
+    if path.endswith('.tar.bz2'):
+        return 'bz2'
+    if path.endswith('.tar.xz'):
+        return 'xz'
+    return ''
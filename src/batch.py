@@ -0,0 +1,106 @@
+import os
+import re
+import json
+import imagetool
+import helperdefs
+import cache
+import log
+
+#this function runs every job of a job file in this process, without asking anything. the images processed by a job are kept and reused by the jobs after it, up to memory_mb MB. the results (one for each job) are written to output as json, or printed if output is None. returns the exit code: 0 if every job worked, 1 otherwise.
+#a job file looks like this (toml files have the same structure):
+#    {"jobs": [
+#        {"name": "blocks", "args": ["--join", "images", "-idir", "blocks"]},
+#        {"name": "npcs", "join": "packed", "input-dir": ["npc"], "output-dir": "out", "convert-gifs": true}
+#    ]}
+#every job gives its arguments either as a list, like on the command line, or as a table with the long names of the arguments (counted ones like quiet take the number of times they're given).
+def run_jobs(filename, output=None, memory_mb=512):
+    #a job file that can't be read fails the whole batch, without waiting for a key either
+    try:
+        jobs = load_jobs(filename)
+    except (FileNotFoundError, ValueError, OSError) as error:
+        log.error(str(error))
+        return 1
+    memo = cache.FrameCache(memory_mb * 1024 * 1024)
+    results = []
+    for n, job in enumerate(jobs):
+        name = job.get('name', str(n + 1))
+        log.info('=== Job ' + name + ' ===')
+        result = {'name': name, 'ok': False, 'error': None, 'images': 0, 'outputs': []}
+        try:
+            args = helperdefs.get_args(get_job_argv(job))
+            if not args.join and not args.separe and not args.skip and args.extract == None and args.apply_palette == None:
+                raise ValueError('ERROR: The job doesn\'t say what to do (join, separe, extract, apply-palette or skip).')
+            if args.batch != None:
+                raise ValueError('ERROR: A job can\'t run other batch jobs.')
+            if args.watch:
+                raise ValueError('ERROR: A job can\'t use --watch.')
+            result.update(imagetool.run(args, memo))
+            result['ok'] = True
+        except (FileNotFoundError, ValueError, OSError) as error:
+            result['error'] = str(error)
+        except re.error:
+            result['error'] = 'ERROR: --input-name not a valid REGEX.'
+        #argparse exits on invalid arguments, that only fails the job
+        except SystemExit:
+            result['error'] = 'ERROR: Invalid arguments.'
+        if result['error'] != None:
+            log.error(result['error'])
+        results.append(result)
+        log.info('')
+
+    if output != None:
+        try:
+            with open(output, 'w') as f:
+                json.dump(results, f, indent=4)
+        except OSError as error:
+            log.error('ERROR: Can\'t write the results to ' + output + ': ' + str(error))
+            return 1
+    else:
+        print(json.dumps(results, indent=4))
+    return 0 if all(r['ok'] for r in results) else 1
+
+#reads the jobs from a json or toml file.
+def load_jobs(filename):
+    if not os.path.isfile(filename):
+        raise FileNotFoundError('ERROR: The job file ' + filename + ' was not found.')
+    if filename.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError('ERROR: Reading toml job files needs Python 3.11 or newer.')
+        try:
+            with open(filename, 'rb') as f:
+                data = tomllib.load(f)
+        except tomllib.TOMLDecodeError as error:
+            raise ValueError('ERROR: ' + filename + ' is not a valid toml file: ' + str(error))
+    else:
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except ValueError as error:
+            raise ValueError('ERROR: ' + filename + ' is not a valid json file: ' + str(error))
+    jobs = data.get('jobs') if isinstance(data, dict) else data
+    if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+        raise ValueError('ERROR: ' + filename + ' doesn\'t have a list of jobs.')
+    return jobs
+
+#the arguments that are counted, like -q -q. in a table they're given as a number, and repeated that many times.
+COUNTED = ('quiet',)
+
+#turns the arguments of a job into a command line. true means the argument is given without a value, false and null mean it's not given.
+def get_job_argv(job):
+    if 'args' in job:
+        return [str(a) for a in job['args']]
+    argv = []
+    for key, value in job.items():
+        if key == 'name' or value is False or value is None:
+            continue
+        if key.replace('-', '_') in COUNTED and isinstance(value, int) and not isinstance(value, bool):
+            argv += ['--' + key.replace('_', '-')] * value
+            continue
+        argv.append('--' + key.replace('_', '-'))
+        if isinstance(value, list):
+            argv += [str(v) for v in value]
+        elif value is not True:
+            argv.append(str(value))
+    return argv
@@ -0,0 +1,113 @@
+import os
+import json
+import collections
+import hashlib
+import archive
+import log
+
+#this class keeps what was found out about every image in the last run (size, palette, hash of the pixels and the name it was saved with), so images that didn't change don't have to be opened again. it's saved as a json file next to the output. an image is found in the cache if its file size and modification time are the same, or if they changed but its content didn't.
+class BuildCache:
+    def __init__(self, filename, settings):
+        self.filename = filename
+        self.settings = settings
+        self.entries = {}
+        self.joined = None
+        if os.path.isfile(filename):
+            try:
+                with open(filename) as f:
+                    data = json.load(f)
+                #if the images were processed differently, nothing in the cache can be used
+                if data['settings'] == settings:
+                    self.entries = data['entries']
+                    self.joined = data['joined']
+            except (ValueError, KeyError):
+                log.error('The cache file ' + filename + ' is not valid, it will be rebuilt.')
+
+    #returns the result of process_image for an image if it's still valid, or None. if save_dir is given, the image must also be there already.
+    def lookup(self, fn, save_dir=None):
+        entry = self.entries.get(os.path.abspath(fn))
+        if entry == None:
+            return None
+        if save_dir != None and not os.path.isfile(save_dir + '/' + os.path.basename(entry['filename'])):
+            return None
+        key = get_file_key(fn)
+        if entry['key'] != key:
+            if entry['hash'] != get_file_hash(fn):
+                return None
+            entry['key'] = key
+        return (entry['filename'], tuple(entry['size']), entry['palette'], entry['pixels'], None)
+
+    #stores the result of process_image for an image.
+    def store(self, fn, result):
+        out_fn, size, pal, pixels, img = result
+        self.entries[os.path.abspath(fn)] = {'key': get_file_key(fn), 'hash': get_file_hash(fn), 'filename': out_fn, 'size': list(size), 'palette': pal, 'pixels': pixels}
+
+    #returns the joined image from the last run if it can be updated in place: the cfg file and the palette size must be the same, and the image must not have been changed since it was saved.
+    def get_joined(self, cfg_str, image_fn, pal_size):
+        if self.joined == None or self.joined['cfg'] != cfg_str or self.joined['image'] != os.path.abspath(image_fn):
+            return None
+        if tuple(self.joined['palette']) != pal_size or not os.path.isfile(image_fn) or self.joined['key'] != get_file_key(image_fn):
+            return None
+        return image_fn
+
+    def set_joined(self, cfg_str, image_fn, pal_size):
+        self.joined = {'cfg': cfg_str, 'image': os.path.abspath(image_fn), 'palette': list(pal_size), 'key': get_file_key(image_fn)}
+
+    #removes the images that weren't seen in this run and saves the cache file.
+    def save(self, seen):
+        seen = set(os.path.abspath(fn) for fn in seen)
+        self.entries = {fn: entry for fn, entry in self.entries.items() if fn in seen}
+        with open(self.filename, 'w') as f:
+            json.dump({'settings': self.settings, 'entries': self.entries, 'joined': self.joined}, f)
+
+#this class keeps the results of process_image in memory, forgetting the ones used least recently once their images take more than limit bytes. it's the memo used by --watch, so only the images that changed are opened again, and by --batch, so images used by more than one job are only opened once.
+class FrameCache:
+    def __init__(self, limit):
+        self.limit = limit
+        self.size = 0
+        self.entries = collections.OrderedDict()
+
+    def __len__(self): return len(self.entries)
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result != None:
+            self.entries.move_to_end(key)
+        return result
+
+    def __setitem__(self, key, result):
+        if key in self.entries:
+            self.size -= get_result_size(self.entries.pop(key))
+        self.entries[key] = result
+        self.size += get_result_size(result)
+        #the newest image is always kept, even if it's bigger than the limit
+        while self.size > self.limit and len(self.entries) > 1:
+            self.size -= get_result_size(self.entries.popitem(last=False)[1])
+
+#the number of bytes used by the image of a process_image result.
+def get_result_size(result):
+    img = result[4]
+    if img == None:
+        return 0
+    w, h = img.size
+    return w * h * len(img.getbands())
+
+#the files an image depends on: the image itself and, for gifs, its mask.
+def get_sources(fn):
+    mask = os.path.splitext(fn)[0] + 'm.gif'
+    if fn.endswith('.gif') and archive.isfile(mask):
+        return [fn, mask]
+    return [fn]
+
+def get_file_key(fn):
+    key = []
+    for f in get_sources(fn):
+        key += archive.get_key(f)
+    return key
+
+def get_file_hash(fn):
+    h = hashlib.sha1()
+    for f in get_sources(fn):
+        with archive.open_file(f, 'rb') as data:
+            h.update(data.read())
+    return h.hexdigest()
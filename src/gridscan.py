@@ -0,0 +1,97 @@
+import collections
+import lazy
+
+#the color the tool fills joined images and spritesheets with, around and between the images.
+MAGENTA = (255, 120, 255, 255)
+
+#returns a 2d array that is true where the image has something in it: pixels that aren't transparent nor magenta.
+def get_content_mask(img):
+    np = lazy.get_numpy()
+    arr = np.asarray(img if img.mode == 'RGBA' else img.convert('RGBA'))
+    return (arr[:, :, 3] != 0) & ~(arr == MAGENTA).all(axis=-1)
+
+#returns an array (rows x columns of cells) that is true for the cells with something in them. cells are im_width x im_height pixels with space pixels between them, starting at origin, like separe_spritesheet crops them. only the cells inside size (the width and height of the spritesheet, the whole image by default) are checked.
+def get_occupied_cells(img, im_width, im_height, space, origin=(0, 0), size=None):
+    np = lazy.get_numpy()
+    w, h = size if size != None else img.size
+    ox, oy = origin
+    pw, ph = im_width + space, im_height + space
+    nx, ny = -(-(w - ox) // pw), -(-(h - oy) // ph)
+    if np is None:
+        return [[not is_empty_cell(img.crop((ox + x * pw, oy + y * ph, ox + x * pw + im_width, oy + y * ph + im_height))) for x in range(nx)] for y in range(ny)]
+    content = get_content_mask(img)[oy:h, ox:w]
+    #the sheet is padded to a whole number of cells, then every cell is checked at once
+    grid = np.zeros((ny * ph, nx * pw), dtype=bool)
+    grid[:content.shape[0], :content.shape[1]] = content
+    return grid.reshape(ny, ph, nx, pw)[:, :im_height, :, :im_width].any(axis=(1, 3))
+
+#same as get_occupied_cells for a single cell, without numpy.
+def is_empty_cell(cell):
+    cell = cell.convert('RGBA')
+    w, h = cell.size
+    return all(c[3] == 0 or c == MAGENTA for n, c in cell.getcolors(max(1, w * h)))
+
+#tries to find the grid of a spritesheet from its separator rows and columns (the ones that are all magenta, or all transparent if there's no magenta). returns (origin, im_width, im_height, space, size), or None if no regular grid is found. size is the width and height of the spritesheet without the palette under it. needs numpy.
+#with magenta separators (like the spritesheets made by this tool) the cells are found exactly. with transparent ones the cells are assumed to have no space between them, and to start where the sprites start.
+def detect_grid(img):
+    np = lazy.get_numpy()
+    if np is None:
+        return None
+    arr = np.asarray(img if img.mode == 'RGBA' else img.convert('RGBA'))
+    magenta = (arr == MAGENTA).all(axis=-1)
+    exact = bool(magenta.any())
+    if exact:
+        #the palette pasted under a joined spritesheet has no magenta, so it's left out (and the transparent columns added when the palette is wider than the spritesheet)
+        last_row = np.nonzero(magenta.any(axis=1))[0][-1]
+        last_col = np.nonzero(magenta.any(axis=0))[0][-1]
+        magenta = magenta[:last_row + 1, :last_col + 1]
+    separator = magenta if exact else arr[:, :, 3] == 0
+    cols = get_cells_1d(separator.all(axis=0), exact)
+    rows = get_cells_1d(separator.all(axis=1), exact)
+    if cols == None or rows == None:
+        return None
+    #a single row (or column) of cells doesn't tell the space, so it's taken from the other direction
+    (ox, im_width, xspace, xruns), (oy, im_height, yspace, yruns) = cols, rows
+    if xruns == 1 and yruns == 1 or xruns > 1 and yruns > 1 and xspace != yspace:
+        return None
+    space = xspace if xruns > 1 else yspace
+    size = img.size
+    if exact:
+        size = (get_cells_end(last_col, ox, im_width, space, size[0]), get_cells_end(last_row, oy, im_height, space, size[1]))
+    return ((ox, oy), im_width, im_height, space, size)
+
+#returns where the row (or column) of cells holding the last magenta pixel ends, which is where the spritesheet ends. when the last magenta pixel is in the space before a full row of cells (which has no magenta), that row is counted too.
+def get_cells_end(last, origin, cell_size, space, limit):
+    end = origin + cell_size
+    while end <= last:
+        end += space + cell_size
+    return min(end, limit)
+
+#finds a regular run of cells in one direction. is_sep is true for every separator column (or row). returns (origin, cell size, space, number of runs of content) or None if the runs don't all fit the same grid.
+def get_cells_1d(is_sep, exact):
+    #the runs of content, as (start, length)
+    runs = []
+    start = None
+    for i, sep in enumerate(list(is_sep) + [True]):
+        if not sep and start == None:
+            start = i
+        elif sep and start != None:
+            runs.append((start, i - start))
+            start = None
+    if len(runs) == 0:
+        return None
+    if len(runs) == 1:
+        return (runs[0][0], runs[0][1], 0, 1)
+    #the distance between cells is the most common distance between two runs
+    pitch = collections.Counter(b[0] - a[0] for a, b in zip(runs, runs[1:])).most_common(1)[0][0]
+    size = collections.Counter(length for s, length in runs).most_common(1)[0][0] if exact else pitch
+    if size > pitch:
+        return None
+    origin = runs[0][0] % pitch
+    #with magenta separators every run is a whole cell. with transparent ones a run is a sprite, which must be inside a single cell
+    for start, length in runs:
+        if exact and (length != size or (start - origin) % pitch != 0):
+            return None
+        if not exact and (start - origin) // pitch != (start + length - 1 - origin) // pitch:
+            return None
+    return (origin, size, pitch - size, len(runs))
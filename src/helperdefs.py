@@ -1,39 +1,70 @@
 from PIL import Image, ImageDraw
 import palette
+import archive
+import log
+import profiler
 import os
 import sys
 import argparse
+import re
+import hashlib
+import json
+import lazy
 
-#this function simply returns all the arguments. i made this to separe the argument stuff from the main.
-def get_args():
+#this function simply returns all the arguments. i made this to separe the argument stuff from the main. argv can be given to parse other arguments than the command line ones (used by batch jobs).
+def get_args(argv=None):
     #help and version arguments
     parser = argparse.ArgumentParser(description='A small tool for aiding in boring image editing. To be used with Super Mario Bros X')
     parser.add_argument('-v', '--version', action='version', version='SMBX Image Tool version 1.3')
     #action arguments
-    parser.add_argument('-j', '--join', choices=['images', 'spritesheet'], help='Joins the images in the folder specified by --input-dir. When --input-dir is not specified, it will use the directory ./edit, located in the program\'s directory. You can choose between joining images normally (by writing \'images\' after --join) or joining in a spritesheet (by writing \'spritesheet\'). If joining in a spritesheet, you\'ll need to specify the spritesheet and image arguments too.')
+    parser.add_argument('-j', '--join', choices=['images', 'spritesheet', 'packed'], help='Joins the images in the folder specified by --input-dir. When --input-dir is not specified, it will use the directory ./edit, located in the program\'s directory. You can choose between joining images normally (by writing \'images\' after --join), joining in a spritesheet (by writing \'spritesheet\') or packing the images as tightly as possible (by writing \'packed\'), which works best with images of different sizes. If joining in a spritesheet, you\'ll need to specify the spritesheet and image arguments too.')
     parser.add_argument('-s', '--separe', action='store_true', help='Separes the images in the folder specified by --input-dir. It can only separe images with a .cfg file (created with --join), but can separe other images if --image-width and --image-height are specified.')
+    parser.add_argument('-x', '--extract', nargs='+', metavar='NAME', help='Crops only the images with these names (wildcards like * can be used) out of the joined images found in --input-dir, using their .cfg files.')
+    parser.add_argument('--apply-palette', nargs=2, metavar=('ORIGINAL', 'EDITED'), help='Recolours every image: each color of the ORIGINAL palette image is changed to the color at the same place in the EDITED one. The palettes can be the images saved with --separe-palette, or joined images with their .cfg file (their palette is read from under the joined images). Without --join or --separe, the recoloured images are simply saved to the output directory, like --skip.')
     parser.add_argument('--skip', '--no-join-or-separe', action='store_true', help='Don\'t join pr separe, instead simply save the images to output directory. This can be used for debugging purposes, or to just do single actions like resizing the images or extracting their palettes.')
     #directory arguments
-    parser.add_argument('-idir', '--input-dir', nargs='+', metavar='DIR', default=[os.getcwd() + '/edit'], help= 'The input directory, more directories can be specified. The default is "edit".')
-    parser.add_argument('-odir', '--output-dir', metavar='DIR', default=os.getcwd() + '/output', help='The output directory. Unlike --input-dir, you can only specify one. The default is "output".')
+    parser.add_argument('-idir', '--input-dir', nargs='+', metavar='DIR', default=[os.getcwd() + '/edit'], help= 'The input directory, more directories can be specified. The default is "edit". A zip or tar archive (.zip, .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz) can be given instead of a directory, and is read without extracting it. The files of compressed tars are kept in memory (up to 256 MB) once the archive is opened, since they can only be read from the start.')
+    parser.add_argument('-odir', '--output-dir', metavar='DIR', default=os.getcwd() + '/output', help='The output directory. Unlike --input-dir, you can only specify one. The default is "output". It can be a zip or tar archive too (created if it doesn\'t exist): everything is saved into it at the end, .cfg and palette files included. Files with the same name are replaced.')
     parser.add_argument('-in', '--input-name', metavar='', help='If given, when joining or separing the tool will search for filenames matching this name.')
     parser.add_argument('-on', '--output-name', metavar='', default='joinedImages', help='If given, the tool will rename any output images by this name, followed by numbers if there is more than one image. The default is \'joinedImages\'') 
     #spritesheet arguments
     parser.add_argument('-spw', '--spritesheet-width', type=int, metavar='', help='The width of the spritesheet, will be ignored if not joining spritesheets.')
     parser.add_argument('-sph', '--spritesheet-height', type=int, metavar='', help='The height of the spritesheet, will be ignored if not joining spritesheets.')
-    parser.add_argument('-imw', '--image-width', type=int, metavar='', help='Different behavior depending on whether it\'s separing or not. When joining (or skipping), this filters the images based on width and height. If separing spritesheets without a .cfg file, the images will be separed based on this argument.')
+    parser.add_argument('-imw', '--image-width', type=int, metavar='', help='Different behavior depending on whether it\'s separing or not. When joining (or skipping), this filters the images based on width and height. If separing spritesheets without a .cfg file, the images will be separed based on this argument. When separing and it\'s not given, --detect-grid can find the size of the images (and the space between them) by itself.')
     parser.add_argument('-imh', '--image-height', type=int, metavar='', help='See above.')
     #optional arguments, execute certain operations on images
     parser.add_argument('--same-dir', action='store_true', help='When specified, the output images are saved to the input directory. Won\'t work when joining images from multiple directories.')
     parser.add_argument('-sp', '--space', default=0, type=int, metavar='', help='Specified the space between the images. Default is no space.')
     parser.add_argument('-r', '--resize', default=100, type=int, metavar='', help='Specifies to resize the output image(s) by a certain number. pass 200 to resize them by double, 50 to resize them by half.')
+    parser.add_argument('--resize-once', action='store_true', help='When joining with --resize, the joined image is resized once, at the end, instead of resizing every image before joining them (the space between the images is resized too). It only works with whole factors bigger than 100, like 200 or 300: when making images smaller, which pixels are kept would depend on where every image is in the joined image. When separing, the separed images are always cropped at their size and resized one by one.')
+    parser.add_argument('--detect-grid', action='store_true', help='When separing a spritesheet without a .cfg file and without --image-width and --image-height, finds the size of the cells and the space between them by looking at the spritesheet (it needs numpy). The palette under a spritesheet joined by this tool is left out.')
+    parser.add_argument('--keep-empty', action='store_true', help='When separing a spritesheet without a .cfg file, also save the cells that are empty (only transparent or magenta). By default they are skipped.')
+    parser.add_argument('--legacy-cfg', action='store_true', help='When joining, writes the .cfg file in the old format (one name|width|height line for every image), which older versions of the tool can read. By default it\'s written as json, with the position of every image.')
     parser.add_argument('--separe-palette', action='store_true', help='When specified, the tool will the save the palette as a separate image.')
     parser.add_argument('--convert-gifs', action='store_true', help='When specified, it will convert any gif found and include them.')
     parser.add_argument('--include-subdirs', action='store_true', help='When specified, the tool will search for images in subdirectories too.')
-    args = parser.parse_args()
+    parser.add_argument('--indexed', action='store_true', help='Keeps the images in palette mode (one byte for every pixel instead of four) while they are used, and saves them that way. Nothing is lost: every color keeps its own palette entry, transparency included. Images with more than 256 colors stay and are saved as RGBA.')
+    parser.add_argument('--png-compress-level', default=6, type=int, choices=range(10), metavar='', help='The compression level of the saved pngs, from 0 (fastest, biggest files) to 9 (slowest, smallest files). The default is 6.')
+    parser.add_argument('--png-optimize', action='store_true', help='Makes the saved pngs as small as possible, at the cost of a slower save. It overrides --png-compress-level.')
+    parser.add_argument('--dedupe', action='store_true', help='When joining, images with the exact same pixels are pasted only once. The cfg file points every copy to the same place, so separing still saves all of them.')
+    parser.add_argument('--cache', action='store_true', help='When joining or skipping, remember every image in a cache file next to the output, so the next run only opens the images that changed. When joining, if the layout is the same only the changed images are pasted over the last joined image.')
+    parser.add_argument('--batch', metavar='FILE', help='Runs every job listed in a json (or toml) file, one after the other, without asking anything. Images used by more than one job are only opened once. Every other argument is ignored.')
+    parser.add_argument('--batch-memory', default=512, type=int, metavar='MB', help='How much memory (in MB) --batch can use to keep images between jobs. The images used least recently are dropped first. The default is 512.')
+    parser.add_argument('--batch-output', metavar='FILE', help='When running --batch, the results of the jobs are written to this file as json. If not given, they are printed at the end.')
+    parser.add_argument('--watch', action='store_true', help='Keeps running: after doing the action once, the input directories are checked for changes and the action is done again every time an image is added, changed or removed, until Ctrl+C is pressed. Images stay in memory between runs, so only the ones that changed are opened again. When skipping or separing, only the changed images are saved or separed again.')
+    parser.add_argument('--watch-interval', default=0.5, type=float, metavar='SECONDS', help='How often --watch checks the input directories, in seconds. The default is 0.5.')
+    parser.add_argument('--watch-memory', default=512, type=int, metavar='MB', help='How much memory (in MB) --watch can use to keep images between runs. The images used least recently are dropped first. The default is 512.')
+    parser.add_argument('-q', '--quiet', action='count', default=0, help='Prints less. Pass it once to hide the messages printed for every image, twice to only print errors.')
+    parser.add_argument('--profile', metavar='FILE', help='Records how long every step takes for every image (opening, converting, resizing, getting the palette, pasting, saving) and how many bytes are written, and saves it to this file.')
+    parser.add_argument('--profile-format', choices=['json', 'chrome'], default='json', help='The format of the --profile file: a json summary of every step and image (the default), or a chrome trace that can be opened with chrome://tracing or perfetto.')
+    parser.add_argument('--jobs', default=1, type=int, metavar='', help='The number of processes used to open, convert, resize and save the images (and of threads used to save separed images). Pass 0 to use every core. The default is 1 (no extra processes). The output is the same whatever the number is.')
+    args = parser.parse_args(argv)
     return args
 
 def gif_to_png_mask(im, immask):
+    np = lazy.get_numpy()
+    if np is not None:
+        return gif_to_png_mask_array(im, immask)
     #convert the images
     im = im.convert('RGBA')
     immask = immask.convert('RGBA')
@@ -45,17 +76,120 @@ def gif_to_png_mask(im, immask):
     immask.paste(im, (0, 0), im)
     return immask
 
+#numpy version of gif_to_png_mask. it does the same three steps as whole-array operations and gives the same exact pixels, including the rounding PIL uses when pasting with a mask.
+def gif_to_png_mask_array(im, immask):
+    np = lazy.get_numpy()
+    im = np.array(im.convert('RGBA'))
+    immask = np.array(immask.convert('RGBA'))
+    palette.replace_color_array(immask, (255, 255, 255, 255), (255, 255, 255, 0))
+    palette.replace_color_array(im, (0, 0, 0, 255), (255, 255, 255, 0))
+    #the images might not have the same size, so only the overlapping part is pasted
+    h, w = min(im.shape[0], immask.shape[0]), min(im.shape[1], immask.shape[1])
+    src = im[:h, :w].astype(np.uint32)
+    dst = immask[:h, :w].astype(np.uint32)
+    a = src[:, :, 3:4]
+    tmp = src * a + dst * (255 - a) + 128
+    immask[:h, :w] = ((tmp >> 8) + tmp) >> 8
+    return Image.fromarray(immask, 'RGBA')
+
 def gif_to_png(im):
     im = im.convert('RGBA')
     return im
 
-#this function parses the cfg file of an image. it takes the filename of the cfg file and returns all the lines related to the images contained in it, plus width, height and space of the joined image (converted to int)
+#converts every gif in a directory (using its mask when there is one) and saves it as a png in the output directory. mask images are not saved on their own. returns the list of the saved filenames.
+def convert_gifs(d, odir):
+    saved = []
+    log.info('Converting gifs in ' + os.path.abspath(d) + '...')
+    for f in sorted(os.listdir(d)):
+        if not f.endswith('.gif') or f.endswith('m.gif'):
+            continue
+        img = load_image(d + '/' + f)
+        fn = os.path.basename(img.filename)
+        log.detail('Saving ' + fn + ' to ' + odir)
+        with profiler.timer('encode', fn):
+            img.save(odir + '/' + fn)
+        saved.append(fn)
+    if len(saved) == 0: log.info('No gifs found.')
+    return saved
+
+CFG_VERSION = 1
+LAYOUTS = ['images', 'spritesheet', 'packed']
+
+#the index of a joined image: its layout, size and space, and the name, position and size of every image in it (copies made by --dedupe also have same_as, the name of the image they copy).
+def get_index(layout, w, h, space, frames):
+    return {'version': CFG_VERSION, 'layout': layout, 'width': w, 'height': h, 'space': space, 'frames': frames}
+
+#this function parses the cfg file of an image and returns its index. it reads the json cfg files, and the old ones too: one name|width|height line for every image (with |x|y for packed images and copies) and type|width|height|space on the last line. in the old files the positions are found by replaying the layout. raises a ValueError if the file can't be read.
 def parse_cfg(filename):
-    with open(filename) as cfg:
-        lines = cfg.read().splitlines()
-        t, w, h, space = lines[-1].rstrip('\n').split('|')
-        lines.remove(lines[-1])
-        return (lines, int(t), int(w), int(h), int(space))
+    with archive.open_file(filename) as cfg:
+        return parse_cfg_text(cfg.read(), filename)
+
+#same as parse_cfg, for the text of a cfg file. filename is only used in the errors.
+def parse_cfg_text(text, filename='The cfg file'):
+    if not text.lstrip().startswith('{'):
+        return parse_legacy_cfg(text, filename)
+    try:
+        index = json.loads(text)
+        if index['version'] > CFG_VERSION:
+            raise ValueError('ERROR: ' + filename + ' was made by a newer version of the tool.')
+        for frame in index['frames']:
+            frame['name'], frame['x'], frame['y'], frame['w'], frame['h']
+    except (KeyError, TypeError) as e:
+        raise ValueError('ERROR: ' + filename + ' is missing ' + str(e) + '.')
+    return index
+
+def parse_legacy_cfg(text, filename='The cfg file'):
+    lines = [line for line in text.splitlines() if line.strip() != '']
+    if len(lines) == 0:
+        raise ValueError('ERROR: ' + filename + ' is empty.')
+    try:
+        t, maxw, maxh, space = [int(n) for n in lines[-1].split('|')]
+    except ValueError:
+        raise ValueError('ERROR: ' + filename + ' should end with a type|width|height|space line.')
+    if t < 0 or t >= len(LAYOUTS):
+        raise ValueError('ERROR: ' + filename + ' has an unknown layout (' + str(t) + ').')
+    frames = []
+    x, y = 0, 0
+    for line in lines[:-1]:
+        try:
+            name, w, h, *pos = line.split('|')
+            frame = {'name': name, 'x': 0, 'y': 0, 'w': int(float(w)), 'h': int(float(h))}
+            if len(pos) > 0:
+                frame['x'], frame['y'] = int(pos[0]), int(pos[1])
+        except (ValueError, IndexError):
+            raise ValueError('ERROR: ' + line + ' in ' + filename + ' should be name|width|height.')
+        frames.append(frame)
+        #packed images and copies have their position written, and don't move the layout
+        if len(pos) > 0:
+            continue
+        if t == 1:
+            frame['x'], frame['y'] = x, y
+            x += space + frame['w']
+            if x >= maxw:
+                x = 0
+                y += space + frame['h']
+        else:
+            frame['x'], frame['y'] = x, int((maxh - frame['h']) / 2)
+            x += frame['w'] + space
+    return get_index(LAYOUTS[t], maxw, maxh, space, frames)
+
+#returns the text of the cfg file for an index, as json or in the old format.
+def format_cfg(index, legacy=False):
+    if not legacy:
+        #one line for every image, so the file stays readable with thousands of them
+        text = '{\n'
+        for key, value in index.items():
+            if key != 'frames':
+                text += '    ' + json.dumps(key) + ': ' + json.dumps(value) + ',\n'
+        return text + '    "frames": [\n' + ',\n'.join('        ' + json.dumps(frame) for frame in index['frames']) + '\n    ]\n}\n'
+    lines = []
+    for frame in index['frames']:
+        line = [frame['name'], str(frame['w']), str(frame['h'])]
+        if index['layout'] == 'packed' or 'same_as' in frame:
+            line += [str(frame['x']), str(frame['y'])]
+        lines.append('|'.join(line))
+    lines.append('|'.join([str(LAYOUTS.index(index['layout'])), str(index['width']), str(index['height']), str(index['space'])]))
+    return '\n'.join(lines)
 
 def isposn(n): return n != None and n > 0
 
@@ -63,9 +197,11 @@ def has_right_wh(w, h, imw, imh): return w == imw and h == imh
 
 def is_mask(im): return im.filename[-5:] == 'm.gif'
 
-def has_mask(f): return os.path.isfile(os.path.splitext(f)[0] + 'm.gif')
+def has_mask(f): return archive.isfile(os.path.splitext(f)[0] + 'm.gif')
+
+def has_cfg(im): return has_cfg_file(im.filename)
 
-def has_cfg(im): return os.path.isfile(os.path.splitext(im.filename)[0] + '.cfg')
+def has_cfg_file(f): return archive.isfile(os.path.splitext(f)[0] + '.cfg')
 
 def check_sp_args(spw, sph, imw, imh): return isposn(spw) and isposn(sph) and isposn(imw) and isposn(imh)
 
@@ -76,39 +212,157 @@ def get_save_dir(odir, fn, is_same): return odir if not is_same else os.path.dir
 
 #this function gets the images on which to operate and returns a list of images. can search recursively as well.
 def get_images(d, include_gifs, include_subdirs):
-    img_list = []
-    print('Searching for images in ' + os.path.abspath(d) + '...')
-    for f in sorted(os.listdir(d)):
+    return [Image.open(archive.get_source(f)) for f in scan_images(d, include_gifs, include_subdirs)]
+
+#this function searches a directory (or an archive, see archive.py) for images and yields their filenames, without opening them. can search recursively as well.
+def scan_images(d, include_gifs, include_subdirs):
+    found = 0
+    log.info('Searching for images in ' + os.path.abspath(d) + '...')
+    for f in sorted(archive.listdir(d)):
         if f.endswith('png') or include_gifs and f.endswith('gif'):
-            print("Found image: " + f)
-            img_list.append(Image.open(d + '/' + f))
-        elif os.path.isdir(d + '/' + f) and include_subdirs:
-            img_list += get_images(d + '/' + f, include_gifs, include_subdirs)
-    if len(img_list) == 0: print('No images found.')
-    return img_list
+            log.detail("Found image: " + f)
+            found += 1
+            yield d + '/' + f
+        elif include_subdirs and archive.isdir(d + '/' + f):
+            for fn in scan_images(d + '/' + f, include_gifs, include_subdirs):
+                found += 1
+                yield fn
+    if found == 0: log.info('No images found.')
+
+#reads the width and height of an image from its header, without decoding it.
+def get_image_size(fn):
+    with Image.open(archive.get_source(fn)) as im:
+        return im.size
+
+#this function checks if an image should be used, looking only at its filename (and at its header when filtering by size). raises an error saying why the image should be skipped.
+def check_image(fn, args):
+    bn = os.path.basename(fn)
+    #don't get a gif image if it's a mask.
+    if fn.endswith('.gif'):
+        if fn.endswith('m.gif'):
+            raise ValueError(bn + ' is a gif mask image. Skipping.')
+    elif args.input_name != None and not re.match(args.input_name, bn):
+        raise ValueError(bn + ': The name of the image didn\'t match the input name. Skipping.')
+    elif (args.join or args.skip) and isposn(args.image_width) and isposn(args.image_height):
+        w, h = get_image_size(fn)
+        if not has_right_wh(w, h, args.image_width, args.image_height):
+            raise ValueError(bn + ': The image doesn\'t have the right width or height.')
+
+#yields only the filenames of the images that pass check_image.
+def filter_images(filenames, args):
+    for fn in filenames:
+        try:
+            check_image(fn, args)
+        except Exception as e:
+            log.detail(str(e))
+            continue
+        yield fn
+
+#opens an image and converts it if it's a gif. the file is closed before returning, and the returned image has the filename it should be saved with.
+def load_image(fn):
+    with Image.open(archive.get_source(fn)) as im:
+        with profiler.timer('decode', fn):
+            im.load()
+        if not fn.endswith('.gif'):
+            img = im.copy()
+        elif not has_mask(fn):
+            with profiler.timer('convert', fn):
+                img = gif_to_png(im)
+        else:
+            with Image.open(archive.get_source(os.path.splitext(fn)[0] + 'm.gif')) as immask:
+                with profiler.timer('decode', fn):
+                    immask.load()
+                with profiler.timer('convert', fn):
+                    img = gif_to_png_mask(im, immask)
+    if fn.endswith('.gif'):
+        fn = os.path.splitext(fn)[0] + '.png'
+    img.filename = fn
+    return img
+
+#opens a palette image for --apply-palette. if it's a joined image with a cfg file, only the palette pasted under the joined images is returned, without the transparent part on its right.
+def load_palette_image(fn):
+    if not archive.isfile(fn):
+        raise FileNotFoundError('ERROR: ' + fn + ' was not found.')
+    img = load_image(fn).convert('RGBA')
+    if has_cfg_file(fn):
+        index = parse_cfg(os.path.splitext(fn)[0] + '.cfg')
+        img = img.crop((0, index['height'], img.size[0], img.size[1]))
+        bbox = img.getbbox()
+        img = img.crop((0, 0, bbox[2] if bbox != None else 0, img.size[1]))
+    return img
+
+#returns a hash of the pixels of an image, so images with the same pixels (even if saved differently) have the same hash.
+def get_image_hash(img):
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    return hashlib.sha1(str(img.size).encode() + img.tobytes()).hexdigest()
+
+def resize_image(img, resn):
+    #at 100% there's nothing to do
+    if resn == 1:
+        return img
+    fn = img.filename
+    with profiler.timer('resize', fn):
+        img = scale_image(img, resn)
+    img.filename = fn
+    return img
+
+#resizes an image with nearest neighbour, to the size given by scale_size. with a whole factor (like 200 or 300) every pixel is repeated, so an image cropped from a resized joined image is the same as the image resized alone. with its inverse (like 50 or 25) one pixel out of every few is kept, always the same ones counting from the top left corner. other factors are left to Image.resize.
+def scale_image(img, resn):
+    w, h = img.size
+    size = (scale_size(w, resn), scale_size(h, resn))
+    scale = get_whole_scale(resn)
+    if scale == None or scale[1] == 1:
+        return img.resize(size, Image.NEAREST)
+    #Image.resize spreads the kept pixels over the whole image when the size isn't a multiple of the factor
+    down = scale[1]
+    return img.transform(size, Image.AFFINE, (down, 0, 0, 0, down, 0), Image.NEAREST)
+
+#returns the size of an image (width or height) resized by resn, rounded down like it always was, so the resized images and the sizes in the cfg files stay the same.
+def scale_size(v, resn):
+    scale = get_whole_scale(resn)
+    if scale == None:
+        return int(v * resn)
+    up, down = scale
+    return v * up // down
+
+#returns (up, 1) if resn is a whole factor, (1, down) if it's the inverse of one, or None.
+def get_whole_scale(resn):
+    if resn >= 1 and abs(resn - round(resn)) < 1e-9:
+        return (round(resn), 1)
+    if resn < 1 and abs(1 / resn - round(1 / resn)) < 1e-9:
+        return (1, round(1 / resn))
+    return None
+
+#returns the number of jobs to use, 0 meaning one per core.
+def get_jobs(n): return n if n > 0 else os.cpu_count()
 
 def get_max_lenght(spritesheet_lenght, image_lenght, space):
     return image_lenght * spritesheet_lenght + space * (spritesheet_lenght - 1)
 
-#edits a filename until it is unique in the directory it should be in.
+#edits a filename until it is unique in the directory (or archive) it should be in.
 def get_filename(f, d):
     num = 2
     newf = f
-    while os.path.isfile(d + '/' + newf):
+    while archive.isfile(d + '/' + newf):
         bn, ext = os.path.splitext(f)
         newf = bn + ' (' + str(num) + ')' + ext
         num += 1
     return newf
 
-#this function checks the input directories and the output directories. it'll automatically remove any input directory that doesn't exist, but it'll raise an error if no input directory remains, or if the output directory doesn't exist. when everything is ok, it'll return the directories.
+#this function checks the input directories and the output directories. it'll automatically remove any input directory that doesn't exist, but it'll raise an error if no input directory remains, or if the output directory doesn't exist. when everything is ok, it'll return the directories. directories can be archives (or directories in archives), an output archive is created if it doesn't exist.
 def check_dirs(idir, odir):
-    if not os.path.isdir(odir) and odir != 'same':
+    out_archive = archive.split(odir)
+    if out_archive != None:
+        if not os.path.isdir(os.path.dirname(os.path.abspath(out_archive[0]))):
+            raise FileNotFoundError('ERROR: The directory of ' + out_archive[0] + ' was not found. Please make sure it exists first.')
+    elif not os.path.isdir(odir) and odir != 'same':
         raise FileNotFoundError('ERROR: ' + odir + ' was not found. Please make sure it exists first.')
 
     dirsToRemove = []
     for d in idir:
-        if not os.path.isdir(d):
-            print('ERROR: ' + d + ' was not found. Please make sure it exists first. (The directory will be removed)')
+        if not archive.isdir(d):
+            log.error('ERROR: ' + d + ' was not found. Please make sure it exists first. (The directory will be removed)')
             dirsToRemove.append(d)
     for d in dirsToRemove:
         idir.remove(d)
@@ -116,7 +370,7 @@ def check_dirs(idir, odir):
         raise FileNotFoundError("ERROR: No real input directory found. Quitting the joining process.")
 
     if len(dirsToRemove) > 0: 
-        print("Any directory not found will be skipped.\n")
+        log.info("Any directory not found will be skipped.\n")
     return (idir, odir)
 
 def initUI(args):
@@ -1,95 +1,195 @@
 from PIL import Image, ImageDraw
 import helperdefs
+import palette
+import archive
+import gridscan
+import packer
+import log
+import profiler
 import os
+import fnmatch
+import collections
 
 #this function pastes a list of images into an image, using the old method (pasting them horizontally) and with optional space. it assumes the image is big enough and every image in the list is a png. Returns the new image.
 def join_images(img_list, space, maxw, maxh):
-    print('Creating new image: width = ' + str(maxw) + '; height = ' + str(maxh))
+    log.info('Creating new image: width = ' + str(maxw) + '; height = ' + str(maxh))
     new_image = Image.new('RGBA', (maxw, maxh), (255, 120, 255, 255)).convert("RGBA")
     draw = ImageDraw.Draw(new_image)
-    x = 0
-    for img in img_list:
-        print('Pasting ' + os.path.basename(img.filename))
+    for img, (x, diff) in zip(img_list, get_strip_positions([img.size for img in img_list], space, maxh)):
+        log.detail('Pasting ' + os.path.basename(img.filename))
         w, h = img.size
-        diff = int((maxh - h) / 2)
         draw.rectangle([(x, diff), (x + w-1, diff + h-1)], (0, 0, 0, 0))          
         new_image.paste(img, (x, diff))
-        x += w + space
     return new_image
 
+#yields the position of every image when pasted horizontally, centered vertically.
+def get_strip_positions(sizes, space, maxh):
+    x = 0
+    for w, h in sizes:
+        yield (x, int((maxh - h) / 2))
+        x += w + space
+
 #this function joins images in a spritesheet. it takes a list of images, a max width and height and a space argument and return the joined image.
 def join_spritesheet(img_list, space, maxw, maxh):
-    print('Creating new spritesheet: width = ' + str(maxw) + '; height = ' + str(maxh))
+    log.info('Creating new spritesheet: width = ' + str(maxw) + '; height = ' + str(maxh))
     new_image = Image.new('RGBA', (maxw, maxh), (255, 120, 255, 255)).convert('RGBA')
     draw = ImageDraw.Draw(new_image)
-    x, y = 0, 0
-    for img in img_list:
-        print('Pasting ' + os.path.basename(img.filename))
+    for img, (x, y) in zip(img_list, get_grid_positions([img.size for img in img_list], space, maxw, maxh)):
+        log.detail('Pasting ' + os.path.basename(img.filename))
         w, h = img.size
         draw.rectangle([(x, y), (x + w - 1, y + h - 1)], (0, 0, 0, 0))          
         new_image.paste(img, (x, y))
+    return new_image
+
+#yields the position of every image in a spritesheet, row by row. stops when the spritesheet is full.
+def get_grid_positions(sizes, space, maxw, maxh):
+    x, y = 0, 0
+    for w, h in sizes:
+        yield (x, y)
         x += space + w
         if y >= maxh:
-            print('Some images might not have been pasted.')
+            log.info('Some images might not have been pasted.')
             break
         elif x >= maxw:
             x = 0
             y += space + h
+
+#returns the position of every image in a layout ('images', 'spritesheet' or 'packed'), and the width and height of the joined image. sheet is (spritesheet width, spritesheet height, image width, image height), only used by spritesheets.
+def get_layout(sizes, layout, space, sheet=None):
+    if layout == 'images':
+        maxh = max([h for w, h in sizes], default=0)
+        return (list(get_strip_positions(sizes, space, maxh)), sum(w + space for w, h in sizes), maxh)
+    if layout == 'packed':
+        return packer.pack_rects(sizes, space)
+    if layout != 'spritesheet':
+        raise ValueError('ERROR: Unknown layout ' + str(layout) + '.')
+    spw, sph, imw, imh = sheet
+    maxw = helperdefs.get_max_lenght(spw, imw, space)
+    maxh = helperdefs.get_max_lenght(sph, imh, space)
+    return (list(get_grid_positions(sizes, space, maxw, maxh)), maxw, maxh)
+
+#writes the position of every pasted frame into the frames of an index. copies (from --dedupe) are given as (frame, i) and point to the position of the i-th pasted frame. frames that weren't pasted (because the spritesheet is full) get no position.
+def set_positions(pasted_frames, aliases, positions):
+    for frame, (x, y) in zip(pasted_frames, positions):
+        frame.update(x=x, y=y)
+    for frame, i in aliases:
+        if i < len(positions):
+            frame.update(x=positions[i][0], y=positions[i][1], same_as=pasted_frames[i]['name'])
+
+#this function pastes a list of images into a new image at the given positions (from packer.pack_rects, or any other layout). returns the new image.
+def join_packed(img_list, positions, maxw, maxh):
+    log.info('Creating new image: width = ' + str(maxw) + '; height = ' + str(maxh))
+    new_image = Image.new('RGBA', (maxw, maxh), (255, 120, 255, 255)).convert('RGBA')
+    paste_images(new_image, img_list, positions)
     return new_image
 
-#separes an image with cfg file. Whether it's an array of images or a spritesheet is determined by looking into the cfg file. Images are resized and then 
-def separe_withcfg(img, odir, resn):
-    lines, issp, maxw, maxh, space = helperdefs.parse_cfg(os.path.splitext(img.filename)[0] + '.cfg')
-    x, y = 0, 0
-    for line in lines:
-        filename, w, h = line.rstrip('\n').split('|')
-        print('Cropping image: ' + filename + ', width: ' + w + ', height: ' + h + '; ', end='')
-        w, h = int(float(w)*resn), int(float(h)*resn)
-        if issp:
-            cropped_img = img.crop((x, y, x + w, y + h))
-            x += space + w
-            if x >= maxw:
-                x = 0
-                y += space + h
-        else:
-            diff = (maxh - h) / 2
-            cropped_img = img.crop((x, diff, x + w, diff + h))
-            x += w + space
-        cropped_img = cropped_img.resize((w, h), Image.NEAREST)
-        save_image(cropped_img, filename, odir)
-
-#this function takes an image and crops the image contained in it. it looks into its .cfg file for specifications. new images are automatically saved into the outpit directory.
-def separe_image(img, odir, resn):
-    lines, maxw, maxh, space = helperdefs.parse_cfg(os.path.splitext(img.filename)[0] + '.cfg')
-    x = 0
-    for line in lines:
-        filename, w, h = line.rstrip('\n').split('|')
-        print('Cropping image: ' + filename + ', width: ' + w + ', height: ' + h + '; ', end='')
-        w, h = int(float(w)*resn), int(float(h)*resn)
-
-#this function separes a spritesheet. takes on input the image (assuming it's a spritesheet) and a resizing number and returns a list with every image separated. this version uses a cfg file.
-def separe_spritesheet_cfg(img, odir, resn):
-    lines, maxw, maxh, space = helperdefs.parse_cfg(os.path.splitext(img.filename)[0] + '.cfg')
-    x, y = 0, 0
-    for line in lines:
-        filename, w, h = line.rstrip('\n').split('|')
-        print('Cropping image: ' + filename + ', width: ' + w + ', height: ' + h + '; ', end='')
-        w, h = int(float(w)*resn), int(float(h)*resn)
+#pastes the images into an existing image at the given positions, clearing the area under each one first.
+def paste_images(new_image, img_list, positions):
+    draw = ImageDraw.Draw(new_image)
+    for img, (x, y) in zip(img_list, positions):
+        log.detail('Pasting ' + os.path.basename(img.filename))
+        w, h = img.size
+        with profiler.timer('paste', img.filename):
+            draw.rectangle([(x, y), (x + w - 1, y + h - 1)], (0, 0, 0, 0))
+            new_image.paste(img, (x, y))
+
+#separes an image with cfg file. The position of every image is read from the cfg file (see helperdefs.parse_cfg). The image must be resized already, the images are cropped out of it at their resized position and saved, using jobs threads.
+def separe_withcfg(img, odir, resn, jobs=1):
+    index = helperdefs.parse_cfg(os.path.splitext(img.filename)[0] + '.cfg')
+    save_crops(img, get_index_crops(index['frames'], resn), odir, jobs)
+
+#crops only the images whose name matches one of names out of a joined image. returns the number of images found.
+def extract_frames(fn, names, odir, resn, jobs=1):
+    index = helperdefs.parse_cfg(os.path.splitext(fn)[0] + '.cfg')
+    frames = [frame for frame in index['frames'] if any(fnmatch.fnmatchcase(frame['name'], name) or fnmatch.fnmatchcase(os.path.splitext(frame['name'])[0], name) for name in names)]
+    if len(frames) == 0:
+        return 0
+    img = helperdefs.load_image(fn)
+    save_crops(img, get_index_crops(frames, resn), odir, jobs)
+    img.close()
+    return len(frames)
 
+#yields every frame of an index as (box, resn, filename). the frames are cropped at their size in the joined image, then resized by resn (None when there's nothing to resize), so they're the same as the images resized alone.
+def get_index_crops(frames, resn):
+    for frame in frames:
+        log.detail('Cropping image: ' + frame['name'] + ', width: ' + str(frame['w']) + ', height: ' + str(frame['h']) + '; ', end='')
+        x, y = frame['x'], frame['y']
+        yield ((x, y, x + frame['w'], y + frame['h']), resn if resn != 1 else None, frame['name'])
 
-def separe_spritesheet(img, odir, resn, fn, im_width, im_height, space):
-    x, y, f = 0, 0, 1
-    maxw, maxh = img.size
+#crops every (box, resn, filename) from the image, resizes it if resn is given and saves it. with more than one job the crops are encoded by a pool of threads (PNG encoding doesn't hold the GIL), with only a few of them waiting at a time.
+def save_crops(img, crops, odir, jobs=1):
+    def crop_and_save(box, resn, fn):
+        with profiler.timer('crop', fn):
+            cropped_img = img.crop(box)
+            if resn != None:
+                cropped_img = helperdefs.scale_image(cropped_img, resn)
+        save_image(cropped_img, fn, odir)
+
+    if jobs == 1:
+        for crop in crops:
+            crop_and_save(*crop)
+        return
+    #imported here, it's slow to import and only needed with --jobs
+    import concurrent.futures
+    img.load()
+    with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+        pending = collections.deque()
+        saving = {}
+        for box, resn, fn in crops:
+            #if the same filename is used twice, the later crop must still be the one that's kept
+            if fn in saving:
+                saving[fn].result()
+            future = pool.submit(crop_and_save, box, resn, fn)
+            pending.append(future)
+            saving[fn] = future
+            if len(pending) >= jobs * 2:
+                pending.popleft().result()
+        while pending:
+            pending.popleft().result()
+
+#separes a spritesheet without a cfg file into cells of im_width x im_height pixels, with space pixels between them, starting at origin, inside size (the whole image by default). the cells are checked all at once first, and the empty ones (only transparent or magenta pixels) aren't saved unless keep_empty is true.
+def separe_spritesheet(img, odir, resn, fn, im_width, im_height, space, jobs=1, origin=(0, 0), keep_empty=False, size=None):
+    size = size if size != None else img.size
+    occupied = None
+    if not keep_empty:
+        with profiler.timer('scan_cells', img.filename):
+            occupied = gridscan.get_occupied_cells(img, im_width, im_height, space, origin, size)
+    save_crops(img, get_grid_crops(size, fn, im_width, im_height, space, origin, occupied), odir, jobs)
+
+#yields a crop for every cell of a spritesheet, row by row, named fn followed by the cell's number. if occupied is given, the cells that are false in it are skipped (but still counted, so every cell keeps the same name).
+def get_grid_crops(size, fn, im_width, im_height, space, origin=(0, 0), occupied=None):
+    x, y, f = origin[0], origin[1], 1
+    maxw, maxh = size
+    row = 0
     while y < maxh:
+        col = 0
         while x < maxw:
-            newimg = img.crop((x, y, x + im_width, y + im_height))
-            save_image(newimg, fn + str(f) + '.png', odir)
+            if occupied is None or occupied[row][col]:
+                yield ((x, y, x + im_width, y + im_height), None, fn + str(f) + '.png')
             f += 1
+            col += 1
             x += space + im_width
-        x = 0
+        x = origin[0]
+        row += 1
         y += space + im_height
 
+#how the images are saved: the zlib compression level of the pngs (0 to 9, 6 is the default of Pillow), whether Pillow should look for the smallest encoding, and whether the images are saved in palette mode (only the ones with 256 colors or less).
+save_options = {'compress_level': 6, 'optimize': False, 'indexed': False}
+
+def set_save_options(compress_level, optimize, indexed):
+    save_options.update(compress_level=compress_level, optimize=optimize, indexed=indexed)
+
 #this function will simply save the images in the output directory.
 def save_image(img, fn, odir):
-    print('Saving ' + fn + ' to ' + odir)
-    img.save(odir + '/' + fn)
+    log.detail('Saving ' + fn + ' to ' + odir)
+    if save_options['indexed'] and img.mode != 'P':
+        indexed = palette.get_indexed_image(img)
+        if indexed == None:
+            log.detail(fn + ' has more than 256 colors, it\'s saved as RGBA.')
+        else:
+            img = indexed
+    with profiler.timer('encode', fn):
+        with archive.open_file(odir + '/' + fn, 'wb') as f:
+            img.save(f, 'PNG', compress_level=save_options['compress_level'], optimize=save_options['optimize'])
+    if profiler.enabled:
+        profiler.count('bytes_written', archive.getsize(odir + '/' + fn), fn)
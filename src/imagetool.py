@@ -1,132 +1,386 @@
 from PIL import Image, ImageDraw
 import os
 import sys
-import re
+import collections
 import helperdefs
 import palette
 import imagejoin
+import cache
+import archive
+import gridscan
+import batch
+import watch
+import log
+import profiler
+import lazy
 
-def real_main():
-    args = helperdefs.get_args()
+#runs the tool with the command line arguments (or argv). returns None, or the exit code when running batch jobs.
+def real_main(argv=None):
+    args = helperdefs.get_args(argv)
+    if args.batch != None:
+        return batch.run_jobs(args.batch, args.batch_output, args.batch_memory)
     
-    if not args.join and not args.separe and not args.skip:
+    if not args.join and not args.separe and not args.skip and args.extract == None and args.apply_palette == None:
         args = helperdefs.initUI(args)
+    if args.watch:
+        return watch.watch(args, args.watch_interval, args.watch_memory)
+    run(args)
 
+#does the action given by the arguments, printing as much as --quiet allows and recording the profile if --profile is given. memo is a cache.FrameCache shared between batch jobs (or runs of --watch) to keep the images that were already processed. if only is given, skipping and separing only use the images in it (joining always uses every image). returns the number of images used and the files written (the images saved when skipping included, not the separed ones).
+def run(args, memo=None, only=None):
+    log.set_level(log.DETAIL - args.quiet)
+    imagejoin.set_save_options(args.png_compress_level, args.png_optimize, args.indexed)
+    if args.profile == None:
+        return run_archived(args, memo, only)
+    #numpy is imported before timing starts, otherwise its import is counted in a stage of the first image
+    lazy.get_numpy()
+    profiler.start()
+    try:
+        with profiler.timer('total'):
+            return run_archived(args, memo, only)
+    finally:
+        profiler.stop()
+        profiler.save(args.profile, args.profile_format)
+        log.info('Profile saved to ' + args.profile)
+
+#does the action, then writes the files saved into archives all at once.
+def run_archived(args, memo, only):
+    try:
+        return run_action(args, memo, only)
+    finally:
+        with profiler.timer('archive'):
+            archive.flush()
+
+def run_action(args, memo, only=None):
+    if args.resize <= 0:
+        raise ValueError('ERROR: --resize must be bigger than 0.')
     args.input_dir, args.output_dir = helperdefs.check_dirs(args.input_dir, args.output_dir)
+    outputs = []
     
-    #get all the images
-    image_list = []
-    for d in args.input_dir:
-        image_list += helperdefs.get_images(d, args.convert_gifs, args.include_subdirs)
-    if len(image_list) == 0:
+    #get the filenames of all the images. nothing is opened yet, the filenames are collected first because the outputs could be saved in an input directory.
+    filenames = []
+    with profiler.timer('scan'):
+        for d in args.input_dir:
+            filenames += helperdefs.scan_images(d, args.convert_gifs, args.include_subdirs)
+    if len(filenames) == 0:
         raise ValueError("ERROR: No image found in any directory.")
+    #the images that didn't change are still needed for the palette image
+    unchanged = []
+    if only != None and not args.join:
+        unchanged = [fn for fn in filenames if fn not in only]
+        filenames = [fn for fn in filenames if fn in only]
+        if len(filenames) == 0:
+            return {'images': 0, 'outputs': []}
 
-    cfg_str = ''
-    max_width, max_height = 0, 0
-    palettes = []
     resn = float(args.resize / 100)
+    #extracting only opens the joined images, not every image
+    if args.extract != None:
+        found = 0
+        for fn in helperdefs.filter_images(filenames, args):
+            found += extract(fn, args, resn)
+        if found == 0:
+            log.error('No image named ' + ', '.join(args.extract) + ' was found.')
+        return {'images': 0, 'outputs': []}
+    #recolouring alone saves the recoloured images, like skipping
+    lut = get_palette_lut(args)
+    if lut != None and not args.join and not args.separe:
+        args.skip = True
+    #with --resize-once the images are joined at their size, and the joined image is resized at the end
+    frame_resn = resn
+    if args.join and args.resize_once and resn != 1:
+        #when making images smaller, an image that doesn't start at a multiple of the factor would keep other pixels than when resized alone
+        if resn < 1 or helperdefs.get_whole_scale(resn) == None:
+            raise ValueError('ERROR: --resize-once only works with whole factors bigger than 100, like 200 or 300.')
+        if args.legacy_cfg:
+            raise ValueError('ERROR: --resize-once can\'t be used with --legacy-cfg.')
+        frame_resn = 1.0
+    #separing crops the images out of the joined images at their size, then resizes them
+    elif args.separe and not args.join and not args.skip:
+        frame_resn = 1.0
+
+    #every image used, with its name and size (and its position when joining)
+    frames = []
+    palettes = palette.PaletteRegistry()
+    #only joining needs every image at once, otherwise each image is dropped once it's done. with --cache, images that didn't change aren't opened, so they're None in the list.
     new_image_list = []
+    sources = []
+    first_fn = None
+    #the images that are pasted. with --dedupe, every image already joined by its hash, and the copies with the image they copy
+    pasted_frames = []
+    hashes = {}
+    aliases = []
+    build_cache = get_cache(args, lut, frame_resn != resn)
 
-    for img in image_list:
-        w, h = img.size
-        fn = img.filename
-        
-        try:
-            bn = os.path.basename(fn)
-            #don't get a gif image if it doesn't have a mask, or if it's a mask.
-            if fn.endswith('.gif'):
-                if fn.endswith('m.gif'):
-                    raise ValueError(bn + ' is a gif mask image. Skipping.')
-                #elif not helperdefs.has_mask(fn):
-                #    raise FileNotFoundError('Mask not found for ' + bn + '. Skipping.')
-            elif args.input_name != None and not re.match(args.input_name, os.path.basename(img.filename)): #output name
-                raise ValueError(bn + ': The name of the image didn\'t match the input name. Skipping.')
-            elif (args.join or args.skip) and helperdefs.isposn(args.image_width) and helperdefs.isposn(args.image_height) and not helperdefs.has_right_wh(w, h, args.image_width, args.image_height):
-                raise ValueError(bn + ': The image doesn\'t have the right width or height.')
-        except Exception as e:
-            print(e)
-            continue
-
-        if img.filename.endswith('.gif'):
-            if not helperdefs.has_mask(fn):
-                img = helperdefs.gif_to_png(img)
-            else:
-                img = helperdefs.gif_to_png_mask(img, Image.open(os.path.splitext(img.filename)[0] + 'm.gif'))
-            fn = os.path.splitext(fn)[0] + '.png'
-        w, h = int(w * resn), int(h * resn);
-        cfg_str += os.path.basename(fn) + '|' + str(w) + '|' + str(h) + '\n'
-        img = img.resize((w, h), Image.NEAREST)
-
-        #if not joining or separing, we can stop here
+    #images are filtered by name and size before being opened, then decoded and resized one at a time (or a few at a time with --jobs)
+    for src, (fn, (w, h), pal, key, img) in process_images(helperdefs.filter_images(filenames, args), args, frame_resn, build_cache, memo, lut):
+        if first_fn is None:
+            first_fn = fn
         if args.skip:
-            save_dir = helperdefs.get_save_dir(args.output_dir, fn, args.same_dir)
-            imagejoin.save_image(img, os.path.basename(fn), save_dir)
-        #copy the resulting image to a new list and preserve filename
-        img.filename = fn 
-        new_image_list.append(img)
-        
-        #get palette and append it to the palette list
-        pal = palette.get_palette(img)
-        if not palette.check_subset(pal, palettes):
-            pal.sort()
-            palettes.append(pal)
+            outputs.append(helperdefs.get_save_dir(args.output_dir, src, args.same_dir) + '/' + os.path.basename(fn))
+        frames.append({'name': os.path.basename(fn), 'w': w, 'h': h})
+
+        is_copy = args.join and args.dedupe and key in hashes
+        if is_copy:
+            log.detail(os.path.basename(fn) + ' is the same as ' + pasted_frames[hashes[key]]['name'] + ', it will be pasted once.')
+            aliases.append((frames[-1], hashes[key]))
+        elif args.join:
+            hashes[key] = len(new_image_list)
+            new_image_list.append(img)
+            sources.append(src)
+            pasted_frames.append(frames[-1])
+        if args.separe:
+            separe(img if frame_resn == 1 else process_image(src, 1.0, None, True, False, lut)[4], args, resn)
         
-        #only get max_width and max_height when joining
-        if not args.join == 'images': 
-            continue 
-        if h > max_height:
-            max_height = h
-        max_width += w + args.space
+        #append the palette to the palette list
+        palettes.add(pal)
     
     #check again if there are no images
-    if len(new_image_list) == 0:
+    if first_fn is None:
         raise ValueError("ERROR: No image remaining.")
    
+    if args.separe_palette:
+        for pal in get_palettes(unchanged, args, frame_resn, memo, lut):
+            palettes.add(pal)
+
     #get an image of the palette (to be pasted on joinedImages or to save separately)
-    pal_image = palette.get_pal_image(palettes)
+    pal_image = palette.get_pal_image(palettes.get_palettes())
     if args.separe_palette:
-        save_dir = helperdefs.get_save_dir(args.output_dir, new_image_list[0].filename, args.same_dir)
-        print('Saving palette image in ' + save_dir)
-        pal_image.save(save_dir + '/' + args.output_name + 'Palette.png')
+        save_dir = helperdefs.get_save_dir(args.output_dir, first_fn, args.same_dir)
+        log.info('Saving palette image in ' + save_dir)
+        imagejoin.save_image(pal_image, args.output_name + 'Palette.png', save_dir)
+        outputs.append(save_dir + '/' + args.output_name + 'Palette.png')
 
     if args.join:
         #error checking for save dir
         if args.same_dir and len(args.input_dir) != 1:
             raise ValueError('ERROR: Saving to the same directory isn\'t supported with multiple input directories. Please specify an output directory.')
-        save_dir = helperdefs.get_save_dir(args.output_dir, new_image_list[0].filename, args.same_dir)
+        save_dir = helperdefs.get_save_dir(args.output_dir, first_fn, args.same_dir)
+
+        #get the position of every image
+        sizes = [(frame['w'], frame['h']) for frame in pasted_frames]
+        sheet = (args.spritesheet_width, args.spritesheet_height, args.image_width, args.image_height)
+        if args.join == 'spritesheet' and not helperdefs.check_sp_args(*sheet):
+            raise ValueError('ERROR: Can\'t join into a spritesheet without each one of the following:\n --spritesheet-width;\n --spritesheet-height;\n --image-width;\n --image-height')
+        positions, max_width, max_height = imagejoin.get_layout(sizes, args.join, args.space, sheet)
+
+        #the copies point to the position of the image they copy. images that weren't pasted (because the spritesheet is full) are left out of the cfg file.
+        imagejoin.set_positions(pasted_frames, aliases, positions)
 
-        #join the images
-        if args.join == 'images':
-            new_image = imagejoin.join_images(new_image_list, args.space, max_width, max_height)
-            cfg_str += '0|' + str(max_width) + '|' + str(max_height) + '|' + str(args.space)
+        #the cfg file describes the resized joined image
+        joined_width, joined_height = max_width, max_height
+        space = args.space
+        if frame_resn != resn:
+            for frame in frames:
+                if 'x' in frame:
+                    scale_frame(frame, resn)
+            max_width, max_height = helperdefs.scale_size(max_width, resn), helperdefs.scale_size(max_height, resn)
+            space = helperdefs.scale_size(space, resn)
+        index = helperdefs.get_index(args.join, max_width, max_height, space, [frame for frame in frames if 'x' in frame])
+        cfg_str = helperdefs.format_cfg(index, args.legacy_cfg)
+        image_fn = save_dir + '/' + args.output_name + '.png'
+        pal_size = pal_image.size if not args.separe_palette else (0, 0)
+
+        #with --cache, when the layout didn't change only the images that changed are pasted over the last joined image
+        if build_cache != None and frame_resn == resn and build_cache.get_joined(cfg_str, image_fn, pal_size):
+            log.info('Updating ' + os.path.basename(image_fn))
+            with Image.open(image_fn) as old_image:
+                new_image = old_image.convert('RGBA')
+            dirty = [(img, pos) for img, pos in zip(new_image_list, positions) if img != None]
+            imagejoin.paste_images(new_image, [img for img, pos in dirty], [pos for img, pos in dirty])
+            if not args.separe_palette:
+                log.info('Pasting palette')
+                palette.update_palette(new_image, pal_image, max_height)
         else:
-            if not helperdefs.check_sp_args(args.spritesheet_width, args.spritesheet_height, args.image_width, args.image_height):
-                raise ValueError('ERROR: Can\'t join into a spritesheet without each one of the following:\n --spritesheet-width;\n --spritesheet-height;\n --image-width;\n --image-height')
-            max_width = helperdefs.get_max_lenght(args.spritesheet_width, args.image_width, args.space)
-            max_height = helperdefs.get_max_lenght(args.spritesheet_height, args.image_height, args.space)
-            cfg_str += '1|' + str(max_width) + '|' + str(max_height) + '|' + str(args.space)
-            new_image = imagejoin.join_spritesheet(new_image_list, args.space, max_width, max_height)
+            #images that didn't change still have to be opened when the whole image is joined again
+            for i, img in enumerate(new_image_list):
+                if img == None:
+                    new_image_list[i] = process_image(sources[i], frame_resn, None, True, False, lut)[4]
+            new_image = imagejoin.join_packed(new_image_list, positions, joined_width, joined_height)
+            if frame_resn != resn:
+                log.info('Resizing the joined image')
+                with profiler.timer('resize', image_fn):
+                    new_image = helperdefs.scale_image(new_image, resn)
         
-        #paste the palette
-        if not args.separe_palette:
-            print('Pasting palette')
-            new_image = palette.paste_palette(new_image, pal_image)
+            #paste the palette
+            if not args.separe_palette:
+                log.info('Pasting palette')
+                new_image = palette.paste_palette(new_image, pal_image)
         
         #Write to the cfg file.
-        with open(save_dir + '/' + args.output_name + '.cfg', 'w') as image_data: image_data.write(cfg_str)
+        with archive.open_file(save_dir + '/' + args.output_name + '.cfg', 'w') as image_data: image_data.write(cfg_str)
         
         #save the joined image
         imagejoin.save_image(new_image, args.output_name + '.png', save_dir)
-    if args.separe:
-        for img in new_image_list:
-            save_dir = helperdefs.get_save_dir(args.output_dir, img.filename, args.same_dir)
-            print('Separing image: ' + os.path.basename(img.filename))
-            if helperdefs.has_cfg(img):
-                try:
-                    imagejoin.separe_withcfg(img, save_dir, resn)
-                except ValueError as e:
-                    print('ERROR: Cannot parse the cfg file correctly.')
-            elif helperdefs.can_separe_sp(img, args.image_width, args.image_height):
-                imagejoin.separe_spritesheet(img, save_dir, resn, args.output_name, args.image_width, args.image_height, args.space)
-            else:
-                print('Can\'t separe ' + os.path.basename(img.filename) + '. Skipping.')
+        outputs += [image_fn, save_dir + '/' + args.output_name + '.cfg']
+        if build_cache != None:
+            build_cache.set_joined(cfg_str, image_fn, pal_size)
+
+    if build_cache != None:
+        build_cache.save(sources if args.join else filenames)
+    return {'images': len(frames), 'outputs': outputs}
+
+#returns the lookup table to recolour the images with for --apply-palette, or None.
+def get_palette_lut(args):
+    if args.apply_palette == None:
+        return None
+    original, edited = args.apply_palette
+    lut = palette.get_palette_lut(helperdefs.load_palette_image(original), helperdefs.load_palette_image(edited))
+    log.info('Recolouring ' + str(len(lut)) + ' colors.')
+    return lut
+
+#resizes the position and size of a frame of the index by resn, like the joined image it's in. the size is the one the image would have if it was resized alone.
+def scale_frame(frame, resn):
+    frame.update(x=helperdefs.scale_size(frame['x'], resn), y=helperdefs.scale_size(frame['y'], resn), w=helperdefs.scale_size(frame['w'], resn), h=helperdefs.scale_size(frame['h'], resn))
+
+#returns the cache to use with --cache, or None. the cache isn't used when separing, since separing needs every image anyway.
+def get_cache(args, lut=None, resize_once=False):
+    if not args.cache or args.separe:
+        return None
+    if archive.split(args.output_dir) != None:
+        raise ValueError('ERROR: --cache can\'t be used when the output is an archive.')
+    cache_dir = helperdefs.get_save_dir(args.output_dir, args.input_dir[0] + '/', args.same_dir)
+    recolor = sorted(lut.items()) if lut != None else None
+    return cache.BuildCache(cache_dir + '/' + args.output_name + '.cache.json', {'resize': args.resize, 'resize_once': resize_once, 'dedupe': args.dedupe, 'join': args.join, 'skip': args.skip, 'recolor': recolor, 'png': [args.png_compress_level, args.png_optimize, args.indexed]})
+
+#does all the work needed for a single image: opening, converting, resizing, recolouring with --apply-palette, getting its palette (and the hash of its pixels for --dedupe) and saving it when skipping. returns the filename, the new size, the palette, the hash and the image itself (only if it's still needed for joining or separing).
+def process_image(fn, resn, save_dir, keep, dedupe, lut=None):
+    img = helperdefs.resize_image(helperdefs.load_image(fn), resn)
+    if lut != None:
+        img = palette.apply_palette_lut(img, lut)
+    pal = palette.get_packed_palette(img)
+    key = helperdefs.get_image_hash(img) if dedupe else None
+    #with --indexed the image is kept in palette mode, a quarter of the memory
+    if imagejoin.save_options['indexed']:
+        indexed = palette.get_indexed_image(img)
+        img = indexed if indexed != None else img
+    #if not joining or separing, we can stop here
+    if save_dir != None:
+        imagejoin.save_image(img, os.path.basename(img.filename), save_dir)
+    return (img.filename, img.size, pal, key, img if keep else None)
+
+#runs process_image on every image and yields each filename with its result, in the same order as the filenames. with --jobs the images are processed by a pool of processes, with only a few images waiting at a time so memory stays bounded. with --cache, images that didn't change since the last run aren't processed at all, and images already in memo (from an earlier batch job) are reused.
+def process_images(filenames, args, resn, build_cache=None, memo=None, lut=None):
+    #images are always kept in memo, since a later job could need them
+    keep = bool(args.join or args.separe) or memo != None
+    def work(fn):
+        save_dir = helperdefs.get_save_dir(args.output_dir, fn, args.same_dir) if args.skip else None
+        return (fn, resn, save_dir, keep, args.dedupe, lut)
+    def cached(fn):
+        if memo != None:
+            result = memo.get(get_memo_key(fn, resn, args.dedupe, lut, args.indexed))
+            if result != None:
+                save_dir = work(fn)[2]
+                if save_dir != None:
+                    imagejoin.save_image(result[4], os.path.basename(result[0]), save_dir)
+                return result
+        if build_cache == None:
+            return None
+        return build_cache.lookup(fn, work(fn)[2])
+    def done(fn, result):
+        if build_cache != None:
+            build_cache.store(fn, result)
+        if memo != None:
+            memo[get_memo_key(fn, resn, args.dedupe, lut, args.indexed)] = result
+        return (fn, result)
+
+    jobs = helperdefs.get_jobs(args.jobs)
+    if jobs == 1:
+        for fn in filenames:
+            result = cached(fn)
+            yield (fn, result) if result != None else done(fn, process_image(*work(fn)))
+        return
+    #imported here, it's slow to import and only needed with --jobs
+    import concurrent.futures
+    #the worker processes print and profile like this one
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(log.level, profiler.enabled, imagejoin.save_options)) as pool:
+        pending = collections.deque()
+        for fn in filenames:
+            result = cached(fn)
+            pending.append((fn, result, pool.submit(run_worker, *work(fn)) if result == None else None))
+            if len(pending) >= jobs * 2:
+                yield get_result(*pending.popleft(), done)
+        while pending:
+            yield get_result(*pending.popleft(), done)
+
+#yields the palette of every image, without saving them. the images kept in memo aren't opened again.
+def get_palettes(filenames, args, resn, memo, lut):
+    with log.silenced():
+        filenames = list(helperdefs.filter_images(filenames, args))
+    for fn in filenames:
+        result = memo.get(get_memo_key(fn, resn, args.dedupe, lut, args.indexed)) if memo != None else None
+        if result == None:
+            result = process_image(fn, resn, None, False, args.dedupe, lut)
+        yield result[2]
+
+#images are the same for two jobs if the file didn't change and they're resized, recoloured and kept in palette mode (--indexed) the same way.
+def get_memo_key(fn, resn, dedupe, lut=None, indexed=False):
+    return (os.path.abspath(fn), tuple(cache.get_file_key(fn)), resn, dedupe, tuple(sorted(lut.items())) if lut != None else None, indexed)
+
+def init_worker(level, profile, save_options):
+    log.set_level(level)
+    imagejoin.save_options.update(save_options)
+    if profile:
+        lazy.get_numpy()
+        profiler.start()
+
+#runs process_image in a worker process, and sends back the profile events and the files saved into archives with the result.
+def run_worker(*args):
+    return (process_image(*args), profiler.take_events(), archive.take_writes())
+
+#gets the result of a process_image call from another process (or from the cache). images lose their filename when sent between processes, so it's put back.
+def get_result(src, result, future, done):
+    if future == None:
+        return (src, result)
+    (fn, size, pal, key, img), events, writes = future.result()
+    profiler.add_events(events)
+    archive.add_writes(writes)
+    if img != None:
+        img.filename = fn
+    return done(src, (fn, size, pal, key, img))
+
+#crops the images named by --extract out of a joined image with a cfg file, without separing the others. returns the number of images found. images without a cfg file are only mentioned in detail, since most images in the input directory usually aren't joined images.
+def extract(fn, args, resn):
+    if not helperdefs.has_cfg_file(fn):
+        log.detail('Can\'t extract from ' + os.path.basename(fn) + ' without a cfg file. Skipping.')
+        return 0
+    save_dir = helperdefs.get_save_dir(args.output_dir, fn, args.same_dir)
+    log.info('Extracting from image: ' + os.path.basename(fn))
+    try:
+        found = imagejoin.extract_frames(fn, args.extract, save_dir, resn, helperdefs.get_jobs(args.jobs))
+    except ValueError as e:
+        log.error('ERROR: Cannot parse the cfg file correctly.')
+        return 0
+    if found == 0:
+        log.detail('No image named ' + ', '.join(args.extract) + ' in ' + os.path.basename(fn) + '.')
+    return found
+
+#returns the grid to separe a spritesheet without a cfg file with, as (origin, width, height, space, size). it's given by --image-width and --image-height, or found by looking at the spritesheet with --detect-grid. returns None if there's no grid.
+def get_grid(img, args):
+    if helperdefs.isposn(args.image_width) and helperdefs.isposn(args.image_height):
+        return ((0, 0), args.image_width, args.image_height, args.space, img.size)
+    if not args.detect_grid:
+        return None
+    with profiler.timer('detect_grid', img.filename):
+        grid = gridscan.detect_grid(img)
+    if grid != None:
+        (x, y), w, h, space, size = grid
+        log.info('Found cells of ' + str(w) + 'x' + str(h) + ' pixels, space ' + str(space) + ', starting at ' + str(x) + ', ' + str(y) + '.')
+    return grid
+
+#separes a single image (at its size), with its cfg file if it has one or as a spritesheet otherwise. spritesheets are resized before being cut into cells, so the size of the cells is the resized one.
+def separe(img, args, resn):
+    save_dir = helperdefs.get_save_dir(args.output_dir, img.filename, args.same_dir)
+    log.info('Separing image: ' + os.path.basename(img.filename))
+    if helperdefs.has_cfg(img):
+        try:
+            imagejoin.separe_withcfg(img, save_dir, resn, helperdefs.get_jobs(args.jobs))
+        except ValueError as e:
+            log.error('ERROR: Cannot parse the cfg file correctly.')
+    else:
+        img = helperdefs.resize_image(img, resn)
+        grid = get_grid(img, args)
+        if grid == None:
+            log.error('Can\'t separe ' + os.path.basename(img.filename) + '. Skipping.')
+            return
+        origin, im_width, im_height, space, size = grid
+        imagejoin.separe_spritesheet(img, save_dir, resn, args.output_name, im_width, im_height, space, helperdefs.get_jobs(args.jobs), origin, args.keep_empty, size)
@@ -0,0 +1,14 @@
+#this module imports the modules that are slow to import only when they're first needed, so starting the tool (or importing it as a library) stays fast. numpy takes longer to import than everything else, and it's optional.
+numpy = None
+tried = False
+
+#returns numpy, or None if it's not installed.
+def get_numpy():
+    global numpy, tried
+    if not tried:
+        tried = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
@@ -0,0 +1,31 @@
+import contextlib
+import contextvars
+
+#this module prints the messages of the tool, so they can be hidden with --quiet. errors are always printed, info messages are about the whole process (like which image is being created), detail messages are printed for every single image.
+ERROR, INFO, DETAIL = 0, 1, 2
+level = DETAIL
+#true inside a silenced() block. it's a context variable, so a block only hides the messages of its own thread (or task) and never changes the level of the others.
+quiet = contextvars.ContextVar('quiet', default=False)
+
+def set_level(n):
+    global level
+    level = max(ERROR, min(DETAIL, n))
+
+def error(msg, end='\n'): print(msg, end=end)
+
+def info(msg, end='\n'):
+    if level >= INFO and not quiet.get():
+        print(msg, end=end)
+
+def detail(msg, end='\n'):
+    if level >= DETAIL and not quiet.get():
+        print(msg, end=end)
+
+#hides the info and detail messages inside a with block.
+@contextlib.contextmanager
+def silenced():
+    token = quiet.set(True)
+    try:
+        yield
+    finally:
+        quiet.reset(token)
@@ -5,8 +5,9 @@ import re
 import imagetool
 
 def main():
+    code = None
     try:
-        imagetool.real_main()
+        code = imagetool.real_main()
     except FileNotFoundError as error:
         print(error)
     except ValueError as error:
@@ -16,8 +17,12 @@ def main():
     except KeyboardInterrupt:
         print('')
         sys.exit()
+    #batch jobs don't wait for a key, they exit with their own code
+    if code != None:
+        sys.exit(code)
     print('')
     input('Press any key to continue...')
     sys.exit()
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import math
+
+#this function packs rectangles of the given sizes into an image as small as it can, keeping space pixels between them. it tries a few widths and keeps the one with the smallest area. returns the (x, y) position of every rectangle (in the same order as sizes), plus the width and height of the image.
+def pack_rects(sizes, space):
+    if len(sizes) == 0:
+        return ([], 0, 0)
+    area = sum((w + space) * (h + space) for w, h in sizes)
+    minw = max(w for w, h in sizes) + space
+    best = None
+    for factor in (1, 1.25, 1.5, 2):
+        binw = max(minw, int(math.ceil(math.sqrt(area) * factor)))
+        positions, w, h = skyline_pack(sizes, space, binw)
+        if best == None or w * h < best[1] * best[2]:
+            best = (positions, w, h)
+    return best
+
+#packs the rectangles with the skyline bottom-left method into a bin binw pixels wide. every rectangle takes its size plus space, and the trailing space is removed from the final size.
+def skyline_pack(sizes, space, binw):
+    #the skyline is a list of [x, y, width] segments covering the whole bin width
+    skyline = [[0, 0, binw]]
+    positions = [None] * len(sizes)
+    #taller rectangles first, the order in sizes is kept for the positions
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0], i))
+    w, h = 0, 0
+    for i in order:
+        rw, rh = sizes[i][0] + space, sizes[i][1] + space
+        best = None
+        for s in range(len(skyline)):
+            y = get_skyline_y(skyline, s, rw, binw)
+            if y != None and (best == None or (y + rh, skyline[s][0]) < (best[1] + rh, best[0])):
+                best = (skyline[s][0], y)
+        x, y = best
+        positions[i] = best
+        add_skyline_segment(skyline, x, y + rh, rw)
+        w, h = max(w, x + rw), max(h, y + rh)
+    return (positions, w - space, h - space)
+
+#returns the y at which a rectangle rw pixels wide can be placed starting from the segment s, or None if it doesn't fit in the bin.
+def get_skyline_y(skyline, s, rw, binw):
+    x = skyline[s][0]
+    if x + rw > binw:
+        return None
+    y = 0
+    left = rw
+    while left > 0:
+        y = max(y, skyline[s][1])
+        left -= skyline[s][2]
+        s += 1
+    return y
+
+#raises the skyline to y between x and x + rw, then merges the segments with the same height.
+def add_skyline_segment(skyline, x, y, rw):
+    new_skyline = []
+    for sx, sy, sw in skyline:
+        #keep the parts of the segment outside the new one
+        if sx < x:
+            new_skyline.append([sx, sy, min(sw, x - sx)])
+        if sx + sw > x + rw:
+            start = max(sx, x + rw)
+            new_skyline.append([start, sy, sx + sw - start])
+    new_skyline.append([x, y, rw])
+    new_skyline.sort()
+    skyline[:] = []
+    for segment in new_skyline:
+        if len(skyline) > 0 and skyline[-1][1] == segment[1]:
+            skyline[-1][2] += segment[2]
+        else:
+            skyline.append(segment)
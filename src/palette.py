@@ -1,32 +1,98 @@
 from PIL import Image, ImageDraw
 import collections
+import profiler
+import lazy
 
-#this function gets the palette of an images. it should sort the colors too TODO
+#this function gets the palette of an images, as a sorted list of RGBA tuples. transparent colors are left out.
 def get_palette(img):
-    pal = []
-    for colorTuple in img.convert('RGBA').getcolors():
-        if colorTuple[1][3] != 0: #check trasparency value
-            pal.append(colorTuple[1])
-    return pal
+    return [unpack_color(c) for c in get_packed_palette(img)]
 
-#this function takes a palette set and creates a new image from it. returns the image itself, plus its width and height.
+#same as get_palette, but every color is packed into a single integer (0xRRGGBBAA). packed colors sort the same way as the tuples do.
+def get_packed_palette(img):
+    with profiler.timer('palette', getattr(img, 'filename', None)):
+        return get_packed_colors(img)
+
+def get_packed_colors(img):
+    np = lazy.get_numpy()
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    if np is not None:
+        colors = np.unique(np.asarray(img).view('>u4'))
+        return colors[colors & 0xff != 0].tolist()
+    w, h = img.size
+    return sorted(pack_color(c) for n, c in img.getcolors(w * h) if c[3] != 0)
+
+def pack_color(c): return c[0] << 24 | c[1] << 16 | c[2] << 8 | c[3]
+
+def unpack_color(c): return (c >> 24 & 0xff, c >> 16 & 0xff, c >> 8 & 0xff, c & 0xff)
+
+#this function takes a palette set and creates a new image from it. every palette is a row of the image. the palettes can be lists of RGBA tuples or of packed colors.
 def get_pal_image(palette_set):
     #get the width and height for the image
     w = 0
     for palette in palette_set: 
         if len(palette) > w: w = len(palette)
     h = len(palette_set)
-    #create blank image
-    img = Image.new('RGBA', (w, h)).convert('RGBA')
-    #draw the palette into the image
-    x, y = 0, 0
+    #build the rows directly as bytes, unused pixels stay transparent
+    data = bytearray()
     for palette in palette_set:
         for color in palette:
-            img.putpixel((x, y), color)
-            x += 1
-        x = 0
-        y += 1
-    return img
+            data += (color if isinstance(color, int) else pack_color(color)).to_bytes(4, 'big')
+        data += bytes(4 * (w - len(palette)))
+    return Image.frombytes('RGBA', (w, h), bytes(data))
+
+#this class keeps the palettes of the images, leaving out any palette that is a subset of another one. palettes are stored as frozensets of packed colors, with an index from every color to the palettes using it, so checking a new palette only looks at the palettes sharing its colors instead of all of them.
+class PaletteRegistry:
+    def __init__(self):
+        self.palettes = {}
+        self.index = collections.defaultdict(set)
+        self.next_id = 0
+
+    def __len__(self): return len(self.palettes)
+
+    #returns true if every color of the palette is already in a stored palette.
+    def is_subset(self, pal):
+        pal = frozenset(pal)
+        if len(pal) == 0:
+            return len(self.palettes) > 0
+        candidates = None
+        #start from the rarest color so the candidate set shrinks quickly
+        for c in sorted(pal, key=lambda c: len(self.index.get(c, ()))):
+            ids = self.index.get(c)
+            if not ids:
+                return False
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return False
+        return True
+
+    #returns the ids of the stored palettes that are a subset of the palette.
+    def subsets_of(self, pal):
+        counts = collections.Counter()
+        for c in pal:
+            counts.update(self.index.get(c, ()))
+        ids = [i for i, n in counts.items() if n == len(self.palettes[i])]
+        ids += [i for i, p in self.palettes.items() if len(p) == 0]
+        return ids
+
+    #adds the palette, unless a stored palette already has all of its colors. stored palettes that the new one contains are removed. returns true if the palette was added.
+    def add(self, pal):
+        pal = frozenset(pal)
+        if self.is_subset(pal):
+            return False
+        for i in self.subsets_of(pal):
+            for c in self.palettes[i]:
+                self.index[c].discard(i)
+            del self.palettes[i]
+        self.palettes[self.next_id] = pal
+        for c in pal:
+            self.index[c].add(self.next_id)
+        self.next_id += 1
+        return True
+
+    #returns the stored palettes in the order they were added, each one as a sorted list of packed colors.
+    def get_palettes(self):
+        return [sorted(p) for p in self.palettes.values()]
 
 def paste_palette(img, img_pal):
     imw, imh = img.size
@@ -39,6 +105,13 @@ def paste_palette(img, img_pal):
 
     return img_with_pal
 
+#pastes the palette again over the one already in a joined image (which must be the same size). imh is the height of the joined image without the palette.
+def update_palette(img, img_pal, imh):
+    imw, h = img.size
+    img.paste((0, 0, 0, 0), (0, imh, imw, h))
+    img.paste(img_pal, (0, imh))
+    return img
+
 def replace_color(data, oldc, newc):
     newdata = []
     for item in data:
@@ -48,8 +121,79 @@ def replace_color(data, oldc, newc):
             newdata.append(item)
     return newdata
 
+#same as replace_color, but works on a numpy array of RGBA pixels (shape h x w x 4) and edits it in place.
+def replace_color_array(arr, oldc, newc):
+    arr[(arr == oldc).all(axis=-1)] = newc
+    return arr
+
+#builds the lookup table used to recolour images, from a palette image and an edited copy of it (which must be the same size): every color of the original becomes the color at the same place in the edited one. transparent places and colors that weren't changed are left out. returns a dict of packed colors. raises a ValueError if a color was changed to two different colors.
+def get_palette_lut(original, edited):
+    if original.size != edited.size:
+        raise ValueError('ERROR: The edited palette is ' + str(edited.size[0]) + 'x' + str(edited.size[1]) + ' but the original one is ' + str(original.size[0]) + 'x' + str(original.size[1]) + '.')
+    lut = {}
+    for old, new in zip(original.convert('RGBA').getdata(), edited.convert('RGBA').getdata()):
+        if old[3] == 0 or old == new:
+            continue
+        old, new = pack_color(old), pack_color(new)
+        if lut.get(old, new) != new:
+            raise ValueError('ERROR: The color ' + str(unpack_color(old)) + ' was changed to two different colors in the edited palette.')
+        lut[old] = new
+    return lut
+
+#recolours an image with a lookup table made by get_palette_lut. colors not in the table are kept. returns a new RGBA image.
+def apply_palette_lut(img, lut):
+    np = lazy.get_numpy()
+    fn = getattr(img, 'filename', None)
+    with profiler.timer('recolor', fn):
+        img = img.convert('RGBA')
+        if len(lut) > 0 and np is not None:
+            img = Image.fromarray(apply_palette_lut_array(np.asarray(img), lut), 'RGBA')
+        elif len(lut) > 0:
+            img.putdata([unpack_color(lut.get(pack_color(c), pack_color(c))) for c in img.getdata()])
+    img.filename = fn
+    return img
+
+#same as apply_palette_lut, but works on a numpy array of RGBA pixels (shape h x w x 4). every pixel is looked up at once in the sorted colors of the table.
+def apply_palette_lut_array(arr, lut):
+    np = lazy.get_numpy()
+    packed = np.ascontiguousarray(arr).view('>u4')[:, :, 0]
+    keys = np.array(sorted(lut), dtype=np.uint32)
+    values = np.array([lut[k] for k in keys.tolist()], dtype='>u4')
+    i = np.minimum(np.searchsorted(keys, packed), len(keys) - 1)
+    new = np.where(keys[i] == packed, values[i], packed).astype('>u4')
+    return new[:, :, None].view(np.uint8).reshape(arr.shape)
+
+#converts an image to palette mode (P) without losing anything: every RGBA color gets its own entry, with its alpha saved as the transparency of the entry. returns None if the image has more than 256 colors.
+def get_indexed_image(img):
+    np = lazy.get_numpy()
+    if img.mode == 'P':
+        return img
+    fn = getattr(img, 'filename', None)
+    with profiler.timer('index', fn):
+        img = img.convert('RGBA')
+        w, h = img.size
+        if np is not None:
+            colors, pixels = np.unique(np.asarray(img).view('>u4').reshape(-1), return_inverse=True)
+            if len(colors) > 256:
+                return None
+            colors = colors.tolist()
+            pixels = pixels.astype(np.uint8).tobytes()
+        else:
+            counts = img.getcolors(256)
+            if counts == None:
+                return None
+            colors = sorted(pack_color(c) for n, c in counts)
+            index = {unpack_color(c): i for i, c in enumerate(colors)}
+            pixels = bytes(index[c] for c in img.getdata())
+        indexed = Image.frombytes('P', (w, h), pixels)
+        indexed.putpalette(b''.join((c >> 8).to_bytes(3, 'big') for c in colors), 'RGB')
+        indexed.info['transparency'] = bytes(c & 0xff for c in colors)
+    indexed.filename = fn
+    return indexed
+
 def check_subset(p, plist):
+    p = set(p)
     for pal in plist:
-        if set(p).issubset(set(pal)):
+        if p.issubset(pal):
             return True
     return False
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import threading
+import collections
+
+#this module records how long every step takes (and some counters, like the bytes written), for each image, when --profile is given. when it's not enabled, timers and counters do nothing.
+enabled = False
+#every event is (kind, name, image, start, duration or value, pid, tid). kind is 'X' for timers and 'C' for counters, like in chrome traces.
+events = []
+lock = threading.Lock()
+
+def start():
+    global enabled
+    enabled = True
+    events[:] = []
+
+def stop():
+    global enabled
+    enabled = False
+
+#times the code inside a with block. image is the filename of the image being worked on, if there is one.
+class timer:
+    def __init__(self, name, image=None):
+        self.name = name
+        self.image = image
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if enabled:
+            end = time.perf_counter()
+            add_event(('X', self.name, self.image, self.start, end - self.start))
+        return False
+
+def count(name, n=1, image=None):
+    if enabled:
+        add_event(('C', name, image, time.perf_counter(), n))
+
+def add_event(event):
+    with lock:
+        events.append(event + (os.getpid(), threading.get_ident()))
+
+#returns the events recorded so far and forgets them. used by the worker processes to send their events back.
+def take_events():
+    with lock:
+        taken = events[:]
+        events[:] = []
+    return taken
+
+def add_events(new_events):
+    with lock:
+        events.extend(new_events)
+
+#returns the total time and number of calls of every step, the totals of the counters, and the same for each image.
+def get_summary():
+    stages = collections.OrderedDict()
+    counters = collections.OrderedDict()
+    images = collections.OrderedDict()
+    for kind, name, image, ts, value, pid, tid in events:
+        if kind == 'X':
+            stage = stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            stage['calls'] += 1
+            stage['seconds'] += value
+            stage['max_seconds'] = max(stage['max_seconds'], value)
+        else:
+            counters[name] = counters.get(name, 0) + value
+        if image != None:
+            image_data = images.setdefault(os.path.basename(image), {})
+            image_data[name] = image_data.get(name, 0) + value
+    for stage in stages.values():
+        stage['seconds'] = round(stage['seconds'], 6)
+        stage['max_seconds'] = round(stage['max_seconds'], 6)
+    for image_data in images.values():
+        for name in image_data:
+            image_data[name] = round(image_data[name], 6)
+    return {'stages': stages, 'counters': counters, 'images': images}
+
+#returns the events in the chrome trace format, which can be opened with chrome://tracing or perfetto.
+def get_chrome_trace():
+    start = min((e[3] for e in events), default=0)
+    trace = []
+    totals = {}
+    for kind, name, image, ts, value, pid, tid in sorted(events, key=lambda e: e[3]):
+        event = {'name': name, 'ph': kind, 'ts': round((ts - start) * 1000000, 3), 'pid': pid, 'tid': tid}
+        if kind == 'X':
+            event['dur'] = round(value * 1000000, 3)
+            event['cat'] = 'stage'
+            if image != None:
+                event['args'] = {'image': os.path.basename(image)}
+        else:
+            totals[name] = totals.get(name, 0) + value
+            event['args'] = {name: totals[name]}
+        trace.append(event)
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+#saves the profile as a json summary (fmt 'json') or as a chrome trace (fmt 'chrome').
+def save(filename, fmt='json'):
+    data = get_chrome_trace() if fmt == 'chrome' else get_summary()
+    with open(filename, 'w') as f:
+        json.dump(data, f, indent=None if fmt == 'chrome' else 4)
@@ -0,0 +1,60 @@
+import os
+import time
+import helperdefs
+import imagetool
+import cache
+import log
+
+#this function runs the tool, then keeps running it again every time an image in the input directories is added, changed or removed, until Ctrl+C is pressed. the directories are checked every interval seconds. the images stay in memory between runs (up to memory_mb MB), so only the ones that changed are opened again. when skipping or separing, only the images that changed are saved or separed again.
+def watch(args, interval, memory_mb):
+    if args.same_dir:
+        raise ValueError('ERROR: --watch can\'t be used with --same-dir, the saved images would be found as changes.')
+    memo = cache.FrameCache(memory_mb * 1024 * 1024)
+    snapshot = get_snapshot(args)
+    run_once(args, memo, None)
+    snapshot = update_outputs(snapshot, args)
+    log.info('Watching ' + ', '.join(os.path.abspath(d) for d in args.input_dir) + ' for changes. Press Ctrl+C to stop.')
+    while True:
+        time.sleep(interval)
+        new_snapshot = get_snapshot(args)
+        if new_snapshot == snapshot:
+            continue
+        changed = [fn for fn, key in new_snapshot.items() if snapshot.get(fn) != key]
+        removed = [fn for fn in snapshot if fn not in new_snapshot]
+        log.info('')
+        log.info('Changed: ' + ', '.join(os.path.basename(fn) for fn in changed + removed))
+        snapshot = new_snapshot
+        run_once(args, memo, changed)
+        snapshot = update_outputs(snapshot, args)
+
+#runs the tool once. only is the list of the images that changed (None for every image). errors are printed and don't stop watching.
+def run_once(args, memo, only):
+    start = time.perf_counter()
+    try:
+        imagetool.run(args, memo, only)
+    except (FileNotFoundError, ValueError, OSError) as error:
+        log.error(str(error))
+        return
+    log.info('Done in ' + str(round((time.perf_counter() - start) * 1000)) + ' ms.')
+
+#returns the images in the input directories, each with the size and modification time of its files (see cache.get_file_key). nothing is printed.
+def get_snapshot(args):
+    snapshot = {}
+    with log.silenced():
+        for d in args.input_dir:
+            for fn in helperdefs.scan_images(d, args.convert_gifs, args.include_subdirs):
+                #the image could be removed while the directory is read
+                try:
+                    snapshot[fn] = cache.get_file_key(fn)
+                except OSError:
+                    pass
+    return snapshot
+
+#the output directory could be inside an input directory, so the images the tool just saved there don't count as changes.
+def update_outputs(snapshot, args):
+    odir = os.path.abspath(args.output_dir)
+    new_snapshot = get_snapshot(args)
+    for fn, key in new_snapshot.items():
+        if os.path.abspath(fn).startswith(odir + os.sep):
+            snapshot[fn] = key
+    return {fn: key for fn, key in snapshot.items() if fn in new_snapshot or not os.path.abspath(fn).startswith(odir + os.sep)}